@@ -0,0 +1,8 @@
+# -*- coding:utf-8 -*-
+"""
+benchmarks of the htmlpp pipeline (lexer -> parser -> codegen -> compile -> load -> render)
+
+    $ python -m benchmarks --scales 1 2 4 8 --output result.json
+    $ python -m benchmarks compare before.json after.json
+    $ python -m benchmarks startup --budget 30  # import time (ms)
+"""
@@ -0,0 +1,83 @@
+# -*- coding:utf-8 -*-
+import sys
+import json
+import argparse
+from .corpus import DEFAULT_CONFIG
+from .pipeline import STAGES, run, compare
+
+
+def print_report(report, out=sys.stderr):
+    for r in report["results"]:
+        print("scale={scale} {sizes}".format(**r), file=out)
+        for name in STAGES:
+            stage = r["stages"][name]
+            print("  {:<8} {:>10.3f} ms {:>12,} bytes".format(name, stage["seconds"] * 1000, stage["peak_bytes"]), file=out)
+    for name in STAGES:
+        scaling = report["scaling"][name]
+        if scaling["exponent"] is not None:
+            print("{:<8} exponent={:.2f} ({})".format(name, scaling["exponent"], scaling["class"]), file=out)
+
+
+def run_command(args):
+    config = DEFAULT_CONFIG._replace(**{k: getattr(args, k) for k in DEFAULT_CONFIG._fields if getattr(args, k) is not None})
+    report = run(scales=args.scales, vary=args.vary, config=config, optimize=args.optimize, repeat=args.repeat, label=args.label,
+                 backend=args.backend)
+    print_report(report)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as wf:
+            wf.write(text)
+    else:
+        print(text)
+
+
+def compare_command(args):
+    with open(args.before) as rf:
+        before = json.load(rf)
+    with open(args.after) as rf:
+        after = json.load(rf)
+    for scale, name, t0, t1, ratio in compare(before, after):
+        ratio = "n/a" if ratio is None else "x{:.2f}".format(ratio)  # None, if before is 0
+        print("scale={} {:<8} {:>10.3f} ms -> {:>10.3f} ms  {}".format(scale, name, t0 * 1000, t1 * 1000, ratio))
+
+
+def startup_command(args):
+    from .startup import run as run_startup
+    report = run_startup(repeat=args.repeat)
+    over = []
+    for name, seconds in report["snippets"].items():
+        print("{:<24} {:>8.1f} ms".format(name, seconds * 1000), file=sys.stderr)
+        if args.budget is not None and name == "import htmlpp.runtime" and seconds * 1000 > args.budget:
+            over.append(name)
+    print(json.dumps(report, indent=2))
+    if over:
+        sys.exit("over the budget ({} ms): {}".format(args.budget, ", ".join(over)))
+
+
+def main(sys_args=sys.argv[1:]):
+    if sys_args[:1] == ["startup"]:
+        parser = argparse.ArgumentParser(prog="python -m benchmarks startup")
+        parser.add_argument("--repeat", type=int, default=10)
+        parser.add_argument("--budget", type=float, default=None, help="ms, for importing htmlpp.runtime")
+        return startup_command(parser.parse_args(sys_args[1:]))
+    if sys_args[:1] == ["compare"]:
+        parser = argparse.ArgumentParser(prog="python -m benchmarks compare")
+        parser.add_argument("before")
+        parser.add_argument("after")
+        return compare_command(parser.parse_args(sys_args[1:]))
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--vary", choices=DEFAULT_CONFIG._fields, default="size")
+    for name in DEFAULT_CONFIG._fields:
+        parser.add_argument("--{}".format(name), type=int, default=None)
+    parser.add_argument("--optimize", "-O", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--backend", choices=["source", "ast"], default="source")
+    parser.add_argument("--label", default=None)
+    parser.add_argument("--output", "-o", default=None)
+    return run_command(parser.parse_args(sys_args))
+
+
+if __name__ == "__main__":
+    main()
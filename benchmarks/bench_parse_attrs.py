@@ -0,0 +1,67 @@
+# -*- coding:utf-8 -*-
+"""
+micro benchmark of htmlpp.utils.parse_attrs, comparing with the shlex based implementation.
+
+    $ python benchmarks/bench_parse_attrs.py
+"""
+import shlex
+import timeit
+from collections import OrderedDict
+from htmlpp.utils import _marker, parse_attrs, _parse_attrs
+
+
+def parse_attrs_shlex(attribute_string):
+    """the previous implementation"""
+    d = OrderedDict()
+    if not attribute_string:
+        return d
+    s = attribute_string.strip().replace("=", "= ")  # hmm
+    symbols = shlex.split(s, posix=False)
+    buf = []
+    itr = iter(symbols)
+    for sym in itr:
+        if sym.endswith("="):
+            if buf:
+                d[" ".join(buf)] = _marker
+            v = next(itr)
+            d[sym[:-1]] = v
+        else:
+            buf.append(sym)
+    if buf:
+        d[" ".join(buf)] = _marker
+    return d
+
+
+SAMPLES = [
+    ' class="panel panel-default"',
+    ' id="main" class="container" data-role=page',
+    ' href="#" :condition="xs"',
+    ' name="foo" {%for i in lines %} {{i}} {% endfor %}',
+    ' type="checkbox" checked disabled',
+]
+
+
+def main(number=20000):
+    for s in SAMPLES:
+        assert parse_attrs(s) == parse_attrs_shlex(s), s
+
+    def run_shlex():
+        for s in SAMPLES:
+            parse_attrs_shlex(s)
+
+    def run_cold():
+        _parse_attrs.cache_clear()
+        for s in SAMPLES:
+            parse_attrs(s)
+
+    def run_memoized():
+        for s in SAMPLES:
+            parse_attrs(s)
+
+    for name, fn in [("shlex", run_shlex), ("scanner", run_cold), ("scanner+memo", run_memoized)]:
+        elapsed = timeit.timeit(fn, number=number)
+        print("{:<14} {:>8.2f} usec/call".format(name, elapsed / (number * len(SAMPLES)) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# -*- coding:utf-8 -*-
+"""synthetic templates for benchmarks"""
+import os.path
+from collections import namedtuple
+
+# size: sections in the main template, defs: @def per library module, depth: nesting of calls,
+# attributes: attributes per tag, fanout: imported library modules
+CorpusConfig = namedtuple("CorpusConfig", "size defs depth attributes fanout")
+DEFAULT_CONFIG = CorpusConfig(size=50, defs=10, depth=3, attributes=2, fanout=2)
+
+
+def attributes(n, prefix="a"):
+    return "".join(' data-{}{}="v{}"'.format(prefix, i, i) for i in range(n))
+
+
+def generate_library(config, i):
+    lines = []
+    for j in range(config.defs):
+        lines.append('<@def name="d{j}">'.format(j=j))
+        lines.append('<div class="lib{i} def{j}"{attrs}>'.format(i=i, j=j, attrs=attributes(config.attributes)))
+        lines.append('<span{attrs}>header {j}</span>'.format(j=j, attrs=attributes(config.attributes, prefix="s")))
+        lines.append('<@yield/>')
+        lines.append('</div>')
+        lines.append('</@def>')
+    return "\n".join(lines)
+
+
+def generate_section(config, k):
+    opening, closing = [], []
+    for d in range(config.depth):
+        alias = "l{}".format(d % config.fanout) if config.fanout else None
+        name = "d{}".format((k + d) % config.defs)
+        command = "{}:{}".format(alias, name) if alias else "local{}".format(d % config.defs)
+        opening.append('<@{command} class:add="s{k}"{attrs}>'.format(
+            command=command, k=k, attrs=attributes(config.attributes, prefix="c")
+        ))
+        closing.append('</@{}>'.format(command))
+    body = '<p class="text"{attrs}>section {k}</p>'.format(k=k, attrs=attributes(config.attributes, prefix="p"))
+    return "".join(opening) + body + "".join(reversed(closing))
+
+
+def generate_main(config):
+    lines = ['<@import module="lib{i}" alias="l{i}"/>'.format(i=i) for i in range(config.fanout)]
+    if not config.fanout:
+        for j in range(config.defs):
+            lines.append('<@def name="local{j}"><div class="local{j}"><@yield/></div></@def>'.format(j=j))
+    lines.append("<html><body>")
+    for k in range(config.size):
+        lines.append(generate_section(config, k))
+    lines.append("</body></html>")
+    return "\n".join(lines)
+
+
+def generate(outdir, config=DEFAULT_CONFIG):
+    """writing the templates into outdir, the name of the main module is returned"""
+    os.makedirs(outdir, exist_ok=True)
+    for i in range(config.fanout):
+        with open(os.path.join(outdir, "lib{}.pre.html".format(i)), "w") as wf:
+            wf.write(generate_library(config, i))
+    with open(os.path.join(outdir, "main.pre.html"), "w") as wf:
+        wf.write(generate_main(config))
+    return "main"
@@ -0,0 +1,147 @@
+# -*- coding:utf-8 -*-
+"""per stage timings (and peak memory) of the pipeline, for the corpus of each scale"""
+import math
+import os.path
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from htmlpp import __version__
+from htmlpp.utils import Gensym, digest
+from htmlpp.loader import get_repository, compile_module, load_module
+from .corpus import DEFAULT_CONFIG, generate
+
+STAGES = ["lex", "parse", "codegen", "compile", "load", "render"]
+SUPERLINEAR_THRESHOLD = 1.3  # exponent of the fitted power law
+
+
+def measure(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        st = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - st)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(times), "peak_bytes": peak}
+
+
+def run_stages(config, workdir, optimize=1, repeat=5, backend="source"):
+    srcdir = os.path.join(workdir, "src")
+    outdir = os.path.join(workdir, "out")
+    os.makedirs(outdir, exist_ok=True)
+    main = generate(srcdir, config)
+    modules = set(sys.modules)
+    # the ast backend compiles in memory (outdir is used only by the "load" stage)
+    repository = get_repository([srcdir], outdir=outdir if backend != "ast" else None, optimize=optimize, backend=backend)
+    try:
+        return _run_stages(repository, srcdir, outdir, main, repeat=repeat, backend=backend)
+    finally:
+        # the outdir is added to sys.path by the repository, and removed with the workdir
+        path = os.path.abspath(outdir)
+        if path in sys.path:
+            sys.path.remove(path)
+        for name in set(sys.modules).difference(modules):
+            if os.path.abspath(getattr(sys.modules[name], "__file__", None) or "").startswith(path + os.sep):
+                del sys.modules[name]
+
+
+def _run_stages(repository, srcdir, outdir, main, repeat=5, backend="source"):
+    transpiler = repository.repository.transpiler
+    codegen = transpiler.codegen.build if backend == "ast" else transpiler.codegen  # ast backend: ast.Module
+    with open(os.path.join(srcdir, main + ".pre.html")) as rf:
+        html = rf.read()
+
+    tokens = transpiler.lexer(html)
+    ast = transpiler.parser(tokens)
+    code = codegen(ast, digest=digest(html))
+    source = transpiler.codegen(ast, digest=digest(html))
+    gensym = Gensym()
+
+    def load():
+        module_id = gensym("_htmlpp_bench")
+        load_module(module_id, compile_module(module_id, source, outdir=outdir))
+        sys.modules.pop(module_id, None)
+
+    module = repository(main)
+    context = repository.create_context()
+    output = module.render(context)
+
+    stages = {
+        "lex": lambda: transpiler.lexer(html),
+        "parse": lambda: transpiler.parser(tokens),
+        "codegen": lambda: codegen(ast, digest=digest(html)),
+        "compile": lambda: compile(code, "<htmlpp:bench>", "exec"),
+        "load": load,
+        "render": lambda: module.render(context),
+    }
+    result = {name: measure(stages[name], repeat=repeat) for name in STAGES}
+    sizes = {"template_bytes": len(html), "tokens": len(tokens), "code_bytes": len(source), "output_bytes": len(output)}
+    return result, sizes
+
+
+def fit_exponent(points):
+    """least squares on log-log, time ~ scale ** exponent"""
+    xs = [math.log(x) for x, _ in points]
+    ys = [math.log(max(y, 1e-9)) for _, y in points]
+    n = len(points)
+    mx, my = sum(xs) / n, sum(ys) / n
+    den = sum((x - mx) ** 2 for x in xs)
+    if den == 0:
+        return None
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / den
+
+
+def run(scales=(1, 2, 4, 8), vary="size", config=DEFAULT_CONFIG, optimize=1, repeat=5, label=None, backend="source"):
+    results = []
+    for scale in scales:
+        scaled = config._replace(**{vary: getattr(config, vary) * scale})
+        workdir = tempfile.mkdtemp()
+        try:
+            stages, sizes = run_stages(scaled, workdir, optimize=optimize, repeat=repeat, backend=backend)
+        finally:
+            shutil.rmtree(workdir)
+        results.append({"scale": scale, "config": scaled._asdict(), "sizes": sizes, "stages": stages})
+
+    scaling = {}
+    for name in STAGES:
+        exponent = None
+        if len(results) >= 2:
+            exponent = fit_exponent([(r["scale"], r["stages"][name]["seconds"]) for r in results])
+        scaling[name] = {
+            "exponent": exponent,
+            "class": None if exponent is None else ("super-linear" if exponent > SUPERLINEAR_THRESHOLD else "linear"),
+        }
+    return {
+        "label": label,
+        "htmlpp_version": __version__,
+        "python": platform.python_version(),
+        "vary": vary,
+        "optimize": optimize,
+        "backend": backend,
+        "repeat": repeat,
+        "results": results,
+        "scaling": scaling,
+    }
+
+
+def compare(before, after):
+    """rows of (scale, stage, before seconds, after seconds, ratio)"""
+    rows = []
+    after_results = {r["scale"]: r for r in after["results"]}
+    for r in before["results"]:
+        other = after_results.get(r["scale"])
+        if other is None:
+            continue
+        for name in STAGES:
+            if name in r["stages"] and name in other["stages"]:
+                t0, t1 = r["stages"][name]["seconds"], other["stages"][name]["seconds"]
+                rows.append((r["scale"], name, t0, t1, t1 / t0 if t0 else None))
+    return rows
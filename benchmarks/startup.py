@@ -0,0 +1,30 @@
+# -*- coding:utf-8 -*-
+"""import time of htmlpp, measured in fresh interpreters (python -c ...), minus the time of the bare interpreter"""
+import sys
+import time
+import subprocess
+
+SNIPPETS = [
+    ("import htmlpp", "import htmlpp"),
+    ("import htmlpp.runtime", "import htmlpp.runtime"),
+    ("import htmlpp.loader", "import htmlpp.loader"),
+    ("compiler", "import htmlpp.codegen, htmlpp.parser"),
+    ("cli", "import htmlpp.cli"),
+]
+
+
+def measure(code, repeat=10):
+    times = []
+    for _ in range(repeat):
+        st = time.perf_counter()
+        subprocess.check_call([sys.executable, "-c", code])
+        times.append(time.perf_counter() - st)
+    return min(times)
+
+
+def run(repeat=10, snippets=SNIPPETS):
+    baseline = measure("pass", repeat=repeat)
+    return {
+        "baseline_seconds": baseline,
+        "snippets": {name: max(0.0, measure(code, repeat=repeat) - baseline) for name, code in snippets},
+    }
@@ -1,10 +1,29 @@
 # -*- coding:utf-8 -*-
-import logging
-logger = logging.getLogger(__name__)
-from htmlpp.lexer import Lexer  # NOQA
-from htmlpp.parser import Parser  # NOQA
-from htmlpp.codegen import Codegen  # NOQA
-from htmlpp.loader import get_repository  # NOQA
+__version__ = "0.0"  # used by htmlpp.loader, so defined before importing submodules
+
+# the compiler is imported on first use, for the processes only rendering precompiled modules
+_lazy_attributes = {
+    "Lexer": "htmlpp.lexer",
+    "Parser": "htmlpp.parser",
+    "Codegen": "htmlpp.codegen",
+    "get_repository": "htmlpp.loader",
+}
+
+
+def __getattr__(name):
+    if name == "logger":
+        import logging
+        value = globals()[name] = logging.getLogger(__name__)
+        return value
+    if name not in _lazy_attributes:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    from importlib import import_module
+    value = globals()[name] = getattr(import_module(_lazy_attributes[name]), name)
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()).union(_lazy_attributes, ["logger"]))
 
 
 def dump_tree(ast, indent=0, d=2, strip_empty_text=True):
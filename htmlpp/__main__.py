@@ -6,4 +6,5 @@ if __name__ == "__main__":
     class args:
         directory = "."
         file = sys.argv[1]
+        profile = False
     render(args)
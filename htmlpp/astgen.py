@@ -0,0 +1,385 @@
+# -*- coding:utf-8 -*-
+"""
+the backend building `ast` nodes directly, instead of the source text (compile() doesn't re-parse it)
+
+    codegen = AstCodegen()
+    code = compile(codegen.build(root, digest=digest), "<htmlpp>", "exec")
+    print(codegen(root))  # the source text, by ast.unparse()
+
+the options which are not supported natively (inlining and prerendering (optimize >= 2), streaming, asynchronous)
+are generated as the source text and parsed, as same as Codegen
+"""
+import ast
+import pickle
+from functools import lru_cache
+from types import SimpleNamespace
+from .codegen import Codegen
+from .nodes import _Root, Def, Yield, Import, PyImport, Command
+from .graph import collect_imports
+from .inlining import iterate_nodes
+from .utils import parse_attrs, string_from_attrs, _marker
+from .runtime import DEFAULT_CHUNK_SIZE
+from .structure import ATTRIBUTES
+
+# compile() requires the locations of the nodes, but ast.fix_missing_locations() and passing them are slow.
+# so the node classes having the location as class attributes are used (on line 1, except FunctionDef)
+LOCATION = dict(lineno=1, col_offset=0, end_lineno=1, end_col_offset=0)
+located = SimpleNamespace(**{name: type(name, (getattr(ast, name), ), LOCATION) for name in [
+    "Name", "Attribute", "Call", "keyword", "Assign", "arg", "FunctionDef", "Constant", "Dict", "Subscript", "Expr",
+    "Import", "ImportFrom", "alias", "If", "With", "Return", "UnaryOp", "BoolOp", "Pass", "Tuple", "List",
+]})
+
+
+@lru_cache(maxsize=1024)
+def _name(id):
+    # the nodes can be shared in the tree (compile() and ast.unparse() don't modify them)
+    return located.Name(id=id, ctx=ast.Load())
+
+
+@lru_cache(maxsize=1024)
+def _store(id):
+    return located.Name(id=id, ctx=ast.Store())
+
+
+def _attr(value, attr):
+    return located.Attribute(value=value, attr=attr, ctx=ast.Load())
+
+
+def _call(func, *args, **kwargs):
+    return located.Call(func=func, args=list(args), keywords=[located.keyword(arg=k, value=v) for k, v in kwargs.items()])
+
+
+def _assign(id, value):
+    return located.Assign(targets=[_store(id)], value=value)
+
+
+def _arguments(names, defaults=()):
+    return ast.arguments(
+        posonlyargs=[], args=[located.arg(arg=name) for name in names], vararg=None,
+        kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=list(defaults)
+    )
+
+
+def _function(name, params, body, defaults=(), decorators=()):
+    node = located.FunctionDef(
+        name=name, args=_arguments(params, defaults), body=body or [located.Pass()],
+        decorator_list=list(decorators), returns=None, type_comment=None
+    )
+    if "type_params" in ast.FunctionDef._fields:  # python 3.12+
+        node.type_params = []
+    return node
+
+
+def _dotted(name):
+    names = name.split(".")
+    node = _name(names[0])
+    for attr in names[1:]:
+        node = _attr(node, attr)
+    return node
+
+
+class Scope(object):
+    """the statements of a function body (or the module). default: the default value of _default_attributes"""
+    def __init__(self, default=None):
+        self.body = []
+        self.default = default
+
+
+class AstCodegen(Codegen):
+    backend = "ast"
+
+    def is_native(self):
+        return self.optimize < 2 and not self.streaming and not self.asynchronous
+
+    def __call__(self, root, digest=None):
+        if not self.is_native():
+            return super().__call__(root, digest=digest)
+        return ast.unparse(self.build(root, digest=digest))
+
+    def build(self, root, digest=None):
+        """ast.Module, passed to compile() directly"""
+        if not self.is_native():
+            return ast.parse(super().__call__(root, digest=digest))
+        self.pyimports = set(node.alias for node in iterate_nodes(root) if isinstance(node, PyImport))
+        self.constants = {}
+        self.hoisted = 0
+        self.outside = []  # toplevel @def
+        self.constant_stmts = []
+        self.hoisted_stmts = []
+        self.setup_stmts = []
+        self.lineno = 1
+
+        body = self.genheader(digest)
+        self.genimports_header(root, body)
+        render_fn = self.genroot(root)
+        body.extend(self.constant_stmts)
+        body.extend(self.hoisted_stmts)
+        body.extend(self.outside)
+        body.append(self.gensetup())
+        body.append(render_fn)
+        body.extend(self.genmain())
+        return ast.Module(body=body, type_ignores=[])
+
+    # module level
+    def genheader(self, digest):
+        runtime_names = ["string_from_attrs", "merge_dict", "StaticAttributes", "_marker", "linking"]
+        if self.encoding is not None:
+            runtime_names.extend(["render_bytes_with", "iterate_bytes_with", "encode_writer"])
+        else:
+            runtime_names.extend(["render_with", "iterate_with"])
+        body = []
+        if self.optimize < 1:
+            body.append(located.Import(names=[located.alias(name="pickle")]))
+        body.append(located.ImportFrom(module="collections", names=[located.alias(name="OrderedDict")], level=0))
+        body.append(located.ImportFrom(module="htmlpp.runtime", names=[located.alias(name=name) for name in runtime_names], level=0))
+        if self.profile:
+            body.append(located.ImportFrom(module="htmlpp.profiling", names=[located.alias(name="profiled")], level=0))
+        body.append(_assign("_HTMLPP_DIGEST", located.Constant(digest)))
+        body.append(_assign("_HTMLPP_FINGERPRINT", located.Constant(self.fingerprint_digest())))
+        if self.encoding is not None:
+            body.append(_assign("_HTMLPP_ENCODING", located.Constant(self.encoding)))
+        return body
+
+    def genimports_header(self, root, body):
+        imports, pyimports = collect_imports(root)
+        if imports:
+            body.append(_assign("_HTMLPP_IMPORTS", located.Constant(imports)))
+        if pyimports:
+            body.append(_assign("_HTMLPP_PYIMPORTS", located.Constant(pyimports)))
+
+    def gensetup(self):
+        context = self.naming["context"]
+        setup = self.naming["setup"]
+        first = located.If(
+            test=located.UnaryOp(op=ast.Not(), operand=_name("first")),
+            body=[located.Return(value=None)], orelse=[]
+        )
+        link = located.With(
+            items=[ast.withitem(context_expr=_call(_name("linking"), _name(context), _name(setup)), optional_vars=_store("first"))],
+            body=[first] + self.setup_stmts, type_comment=None
+        )
+        return self.function(setup, [context], [link])
+
+    def genmain(self):
+        context = self.naming["context"]
+        writer = self.naming["writer"]
+        fnname = self.naming["render_fmt"].format("")
+        setup = located.Expr(_call(_name(self.naming["setup"]), _name(context)))
+        render_with, iterate_with = "render_with", "iterate_with"
+        if self.encoding is not None:
+            render_with, iterate_with = "render_bytes_with", "iterate_bytes_with"
+        render = self.function("render", [context, writer], [
+            setup,
+            located.Return(_call(_name(render_with), _name(fnname), _name(context), **{writer: _name(writer)})),
+        ], defaults=[located.Constant(None)])
+        render_iter = self.function("render_iter", [context, "chunk_size"], [
+            setup,
+            located.Return(_call(_name(iterate_with), _name(fnname), _name(context), chunk_size=_name("chunk_size"))),
+        ], defaults=[located.Constant(DEFAULT_CHUNK_SIZE)])
+        return [render, render_iter]
+
+    # functions
+    def function(self, name, params, body, defaults=(), decorators=()):
+        """FunctionDef having its own line number (the other nodes are on line 1), to tell the frames apart"""
+        node = _function(name, params, body, defaults=defaults, decorators=decorators)
+        self.lineno += 1
+        node.lineno = node.end_lineno = self.lineno
+        for decorator in node.decorator_list:  # co_firstlineno is the line of the first decorator
+            decorator.lineno = decorator.end_lineno = self.lineno
+        return node
+
+    def decorators(self, name):
+        if not self.profile:
+            return []
+        return [_call(_name("profiled"), _name("__name__"), located.Constant(name))]
+
+    def genroot(self, root):
+        fnname = self.naming["render_fmt"].format("")
+        params = self.params(self.naming["context"], self.naming["kwargs"], self.naming["default_attributes"])
+        scope = Scope()
+        for node in root.children:
+            if isinstance(node, Def):
+                self.outside.append(self.gendef(node))
+            else:
+                self.gennode(node, scope)
+        return self.function(fnname, params, scope.body, defaults=[located.Dict(keys=[], values=[])], decorators=self.decorators(fnname))
+
+    def gendef(self, node):
+        fnname = self.naming["render_fmt"].format(node.name)
+        params = self.params(self.naming["context"], self.naming["kwargs"], self.naming["default_attributes"])
+        scope = Scope(default=self.default_attributes({}))
+        for child in node.children:
+            self.gennode(child, scope, use_pickle=True)
+        return self.function(fnname, params, scope.body, defaults=[scope.default], decorators=self.decorators(fnname))
+
+    def genblock(self, block, name, label):
+        scope = Scope()
+        for node in block.children:
+            self.gennode(node, scope)
+        return self.function(name, self.params(self.naming["context"]), scope.body, decorators=self.decorators(label))
+
+    # nodes
+    def gennode(self, node, scope, use_pickle=False):
+        if isinstance(node, Def):
+            scope.body.append(self.gendef(node))
+        elif isinstance(node, Yield):
+            self.genyield(node, scope)
+        elif isinstance(node, PyImport):
+            self.genpyimport(node)
+        elif isinstance(node, Import):
+            self.genimport(node)
+        elif isinstance(node, Command):
+            self.gencommand(node, scope)
+        elif isinstance(node, _Root):
+            raise ValueError("root node is nested")
+        elif not hasattr(node, "children"):
+            self.gentext(node, scope, use_pickle=use_pickle)
+
+    def genyield(self, node, scope):
+        fnname = self.naming["block_fmt"].format(node.content_name)
+        blocks = _attr(_name(self.naming["kwargs"]), "blocks")
+        fn = located.Subscript(value=blocks, slice=located.Constant(fnname), ctx=ast.Load())
+        scope.body.append(located.Expr(_call(fn, *map(_name, self.params(self.naming["context"])))))
+
+    def genimport(self, node):
+        context = self.naming["context"]
+        import_module = _call(_attr(_name(context), "import_module"), located.Constant(node.module), located.Constant(node.alias))
+        self.setup_stmts.append(_assign("_m", import_module))
+        self.setup_stmts.append(self.setup_imported(context))
+
+    def genpyimport(self, node):
+        context = self.naming["context"]
+        self.setup_stmts.append(located.Import(names=[located.alias(name=node.module)]))
+        target = located.Subscript(value=_name(context), slice=located.Constant(node.alias), ctx=ast.Store())
+        self.setup_stmts.append(located.Assign(targets=[_store("_m"), target], value=_dotted(node.module)))
+        self.setup_stmts.append(self.setup_imported(context))
+
+    def setup_imported(self, context):
+        setup = self.naming["setup"]
+        return located.Expr(located.BoolOp(op=ast.And(), values=[
+            _call(_name("hasattr"), _name("_m"), located.Constant(setup)),
+            _call(_attr(_name("_m"), setup), _name(context)),
+        ]))
+
+    def gencommand(self, node, scope):
+        context = self.naming["context"]
+        kwargs = self.naming["kwargs"]
+        keys, values = [], []
+        for block in node.collect_block_nodes():
+            block_name = self.naming["block_fmt"].format(block.name)
+            label = "{}@{}".format(block_name, node.name)
+            if self.optimize >= 1 and self.is_capture_free(block):
+                fnname = "_{}_{}".format(block_name, self.hoisted)
+                self.hoisted += 1
+                self.hoisted_stmts.append(self.genblock(block, fnname, label))
+            else:
+                fnname = block_name
+                scope.body.append(self.genblock(block, fnname, label))
+            keys.append(located.Constant(block_name))
+            values.append(_name(fnname))
+
+        args = [located.Dict(keys=keys, values=values)]
+        if node.attrs:
+            args.append(self.attributes_node(node.attrs))
+        options = {}
+        if self.naming["attributes"] != ATTRIBUTES:
+            options["name"] = located.Constant(self.naming["attributes"])
+        new_kwargs = "new_{}".format(kwargs)
+        scope.body.append(_assign(new_kwargs, _call(_attr(_name(kwargs), "child"), *args, **options)))
+
+        writer = _name(self.naming["writer"])
+        if node.is_module_access(node.name):
+            module_name, name = node.name.split(":")
+            module = located.Subscript(value=_name(context), slice=located.Constant(module_name), ctx=ast.Load())
+            fn = _attr(module, self.naming["render_fmt"].format(name))
+            if module_name in self.pyimports and self.encoding is not None:
+                writer = _call(_name("encode_writer"), writer, _name("_HTMLPP_ENCODING"))
+        else:
+            fn = _name(self.naming["render_fmt"].format(node.name))
+        scope.body.append(located.Expr(_call(fn, writer, _name(context), _name(new_kwargs))))
+
+    def gentext(self, text, scope, use_pickle=False):
+        if not text.strip():
+            return
+        match = self.html_tag_regex.search(text)
+        if not match:
+            self.write_node(scope, text)
+            return
+
+        prefix, tag, attrs_str, suffix = match.groups()
+        attrs = parse_attrs(attrs_str or "")
+        if attrs and use_pickle:
+            scope.default = self.default_attributes(attrs)  # the last one is used
+
+        if not prefix and use_pickle:
+            self.genmerged(text, match, scope)
+        else:
+            body = "{text}<{prefix}{tag}{attrs}{suffix}>{rest}".format(
+                text=text[:match.start()],
+                prefix=prefix,
+                tag=tag,
+                attrs=string_from_attrs(attrs),
+                suffix=suffix,
+                rest=text[match.end():]
+            )
+            self.write_node(scope, body)
+
+    def genmerged(self, text, match, scope):
+        prefix, tag, attrs_str, suffix = match.groups()
+        attributes = _attr(_name(self.naming["kwargs"]), "attributes")
+        defaults = _name(self.naming["default_attributes"])
+        self.write_node(scope, "{text}<{prefix}{tag}".format(text=text[:match.start()], prefix=prefix, tag=tag))
+        if self.optimize >= 1:
+            self.write_expr(scope, _call(_attr(defaults, "render"), attributes))
+        else:
+            scope.body.append(_assign("D", _call(_name("OrderedDict"))))
+            scope.body.append(located.Expr(_call(_name("merge_dict"), _name("D"), defaults)))
+            merge = located.Expr(_call(_name("merge_dict"), _name("D"), attributes))
+            scope.body.append(located.If(test=attributes, body=[merge], orelse=[]))
+            self.write_expr(scope, _call(_name("string_from_attrs"), _name("D")))
+        self.write_node(scope, "{suffix}>{rest}".format(suffix=suffix, rest=text[match.end():]))
+
+    # writing
+    def write_node(self, scope, body):
+        if not body:
+            return
+        if self.encoding is not None:
+            body = body.encode(self.encoding)
+        last = scope.body[-1] if scope.body else None
+        if self.optimize >= 1 and getattr(last, "htmlpp_constant", False):
+            last.value.args[0].value += body  # coalescing
+            return
+        stmt = located.Expr(_call(_name(self.naming["writer"]), located.Constant(body)))
+        stmt.htmlpp_constant = True
+        scope.body.append(stmt)
+
+    def write_expr(self, scope, expr):
+        if self.encoding is not None:
+            expr = _call(_attr(expr, "encode"), _name("_HTMLPP_ENCODING"))
+        scope.body.append(located.Expr(_call(_name(self.naming["writer"]), expr)))
+
+    # attributes
+    def attributes_node(self, attrs):
+        """StaticAttributes as module level constant (optimize >= 1), or pickled one"""
+        if self.optimize < 1:
+            return self.pickled_node(attrs)
+        key = self.attributes_literal(attrs)
+        if key not in self.constants:
+            self.constants[key] = name = "_HTMLPP_CONST_{}".format(len(self.constants))
+            self.constant_stmts.append(_assign(name, self.static_attributes_node(attrs)))
+        return _name(self.constants[key])
+
+    def default_attributes(self, attrs):
+        if self.optimize < 1:
+            return self.pickled_node(attrs) if attrs else located.Dict(keys=[], values=[])
+        return self.static_attributes_node(attrs)
+
+    def static_attributes_node(self, attrs):
+        items = [
+            located.Tuple(elts=[located.Constant(k), _name("_marker") if v is _marker else located.Constant(v)], ctx=ast.Load())
+            for k, v in attrs.items()
+        ]
+        return _call(_name("StaticAttributes"), located.List(elts=items, ctx=ast.Load()))
+
+    def pickled_node(self, attrs):
+        return _call(_attr(_name("pickle"), "loads"), located.Constant(pickle.dumps(attrs)))
@@ -0,0 +1,159 @@
+# -*- coding:utf-8 -*-
+import os.path
+import json
+import logging
+
+from . import __version__
+from .utils import digest
+from .loader import ModuleTranspiler, FileSystemModuleRepository, digest_file, is_modified
+
+logger = logging.getLogger(__name__)
+MANIFEST = ".htmlpp-manifest.json"
+
+
+def write_atomically(path, text, mode="w"):
+    import tempfile
+    dirpath = os.path.dirname(path) or "."
+    os.makedirs(dirpath, exist_ok=True)
+    fd, tmppath = tempfile.mkstemp(dir=dirpath, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as wf:
+            wf.write(text)
+        os.replace(tmppath, path)
+    except BaseException:
+        os.unlink(tmppath)
+        raise
+
+
+def iterate_sources(srcdir, ext=".pre.html"):
+    """relative paths of the templates"""
+    for root, dirs, files in os.walk(srcdir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(ext):
+                yield os.path.relpath(os.path.join(root, name), srcdir)
+
+
+def module_name_from_path(relpath, ext=".pre.html"):
+    return relpath[:-len(ext)].replace(os.sep, ".")
+
+
+def read_manifest(outdir):
+    """the manifest written by Builder, or None"""
+    try:
+        with open(os.path.join(outdir, MANIFEST)) as rf:
+            return json.load(rf)
+    except (OSError, ValueError):
+        return None
+
+
+def output_path(outdir, module_name):
+    return os.path.join(outdir, *module_name.split(".")) + ".py"
+
+
+_transpilers = {}  # per process
+
+
+def get_transpiler(srcdir, ext, codegen_options):
+    key = (srcdir, ext, tuple(sorted(codegen_options.items())))
+    if key not in _transpilers:
+        transpiler = ModuleTranspiler(**codegen_options)
+        transpiler.locate = FileSystemModuleRepository([srcdir], transpiler, ext=ext).lookup_target_file_path
+        _transpilers[key] = transpiler
+    return _transpilers[key]
+
+
+def compile_file(srcdir, relpath, outdir, ext=".pre.html", codegen_options=None):
+    """(relpath, source digest, dependencies)"""
+    codegen_options = codegen_options or {}
+    transpiler = get_transpiler(srcdir, ext, codegen_options)
+    with open(os.path.join(srcdir, relpath)) as rf:
+        html = rf.read()
+    module_name = module_name_from_path(relpath, ext=ext)
+    write_atomically(output_path(outdir, module_name), transpiler.emit(html))
+    return relpath, digest(html), transpiler.codegen.dependencies
+
+
+def _compile_file(args):
+    return compile_file(*args)
+
+
+class Builder(object):
+    """compiling the whole template tree into outdir (python modules, importable with outdir on sys.path)"""
+    def __init__(self, srcdir, outdir, ext=".pre.html", jobs=None, **codegen_options):
+        self.srcdir = srcdir
+        self.outdir = outdir
+        self.ext = ext
+        self.jobs = jobs
+        self.codegen_options = codegen_options
+        self.manifest_path = os.path.join(outdir, MANIFEST)
+        fingerprint = ModuleTranspiler(**codegen_options).codegen.fingerprint()
+        self.fingerprint = digest("{}:{}".format(__version__, fingerprint))
+
+    def load_manifest(self):
+        manifest = read_manifest(self.outdir)
+        if manifest is None or manifest.get("fingerprint") != self.fingerprint:
+            return {}
+        return manifest.get("files", {})
+
+    def dump_manifest(self, files):
+        write_atomically(self.manifest_path, json.dumps({"fingerprint": self.fingerprint, "files": files}, indent=2, sort_keys=True))
+
+    def locate(self, module_name):
+        path = os.path.join(self.srcdir, *module_name.split(".")) + self.ext
+        return path if os.path.exists(path) else None
+
+    def is_fresh(self, relpath, entry):
+        if entry is None:
+            return False
+        if not os.path.exists(output_path(self.outdir, module_name_from_path(relpath, ext=self.ext))):
+            return False
+        if digest_file(os.path.join(self.srcdir, relpath)) != entry["digest"]:
+            return False
+        return not is_modified(entry["dependencies"], self.locate)
+
+    def generate_packages(self, relpaths):
+        for relpath in relpaths:
+            dirpath = os.path.dirname(relpath)
+            while dirpath:
+                initpath = os.path.join(self.outdir, dirpath, "__init__.py")
+                if not os.path.exists(initpath):
+                    write_atomically(initpath, "")
+                dirpath = os.path.dirname(dirpath)
+
+    def remove_outputs(self, relpaths):
+        for relpath in relpaths:
+            path = output_path(self.outdir, module_name_from_path(relpath, ext=self.ext))
+            if os.path.exists(path):
+                logger.info("removed: %s", path)
+                os.unlink(path)
+
+    def collect(self, files, results):
+        for relpath, source_digest, dependencies in results:
+            logger.info("compiled: %s", relpath)
+            files[relpath] = {"digest": source_digest, "dependencies": dependencies}
+
+    def build(self, force=False):
+        """(compiled, skipped) relative paths"""
+        manifest = {} if force else self.load_manifest()
+        relpaths = list(iterate_sources(self.srcdir, ext=self.ext))
+        targets = [relpath for relpath in relpaths if not self.is_fresh(relpath, manifest.get(relpath))]
+        self.remove_outputs(set(manifest).difference(relpaths))
+
+        files = {relpath: manifest[relpath] for relpath in relpaths if relpath not in targets}
+        tasks = [(self.srcdir, relpath, self.outdir, self.ext, self.codegen_options) for relpath in targets]
+        if self.jobs == 1 or len(tasks) <= 1:
+            self.collect(files, map(_compile_file, tasks))
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            jobs = self.jobs or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                chunksize = max(1, len(tasks) // (4 * jobs))
+                self.collect(files, executor.map(_compile_file, tasks, chunksize=chunksize))
+        self.generate_packages(targets)
+        self.dump_manifest(files)
+        return targets, [relpath for relpath in relpaths if relpath not in targets]
+
+
+def build(srcdir, outdir, ext=".pre.html", jobs=None, force=False, **codegen_options):
+    return Builder(srcdir, outdir, ext=ext, jobs=jobs, **codegen_options).build(force=force)
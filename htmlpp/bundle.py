@@ -0,0 +1,144 @@
+# -*- coding:utf-8 -*-
+"""
+a single file holding the compiled modules of a template tree (code objects, marshalled)
+
+    $ htmlpp bundle templates/ -o templates.htmlppz    # binary bundle
+    $ htmlpp bundle templates/ -o templates_bundle.py  # importable module, embedding the bundle
+
+    repository = get_repository([], bundle="templates.htmlppz")
+    repository = templates_bundle.get_repository()
+
+loading is one open and one unmarshal, each module is executed at the first lookup.
+the codegen options (optimize, naming, encoding, ...) must be the same as the ones used on bundling
+"""
+import time
+import logging
+import marshal
+from collections import OrderedDict
+from importlib.util import MAGIC_NUMBER
+
+from . import __version__
+from .utils import digest
+from .exceptions import NotFound, InvalidBundle
+from .runtime import RUNTIME_VERSION
+from .graph import collect_imports
+from .loader import ModuleTranspiler, ModuleIndex, FileSystemModuleRepository, FrozenRepositoryWrapper, load_module_from_code
+
+logger = logging.getLogger(__name__)
+HEADER = b"HTMLPPB\x01"
+
+MODULE_TEMPLATE = '''\
+# generated by htmlpp bundle, don't edit
+_HTMLPP_BUNDLE = {payload!r}
+
+
+def get_repository(**options):
+    from htmlpp.bundle import get_bundle_repository
+    return get_bundle_repository(_HTMLPP_BUNDLE, **options)
+'''
+
+
+class Bundler(object):
+    def __init__(self, srcdir, ext=".pre.html", **codegen_options):
+        self.srcdir = srcdir
+        self.ext = ext
+        self.transpiler = ModuleTranspiler(**codegen_options)
+        self.transpiler.locate = FileSystemModuleRepository([srcdir], self.transpiler, ext=ext).lookup_target_file_path
+
+    def collect(self, roots=None):
+        """module name -> the template path. the roots and the modules reachable through @import (default: all)"""
+        from .build import iterate_sources, module_name_from_path
+        if roots is None:
+            roots = [module_name_from_path(relpath, ext=self.ext) for relpath in iterate_sources(self.srcdir, ext=self.ext)]
+        found = OrderedDict()
+        stack = list(reversed(roots))
+        while stack:
+            module_name = stack.pop()
+            if module_name in found:
+                continue
+            path = self.transpiler.locate(module_name)
+            if path is None:
+                raise NotFound(module_name)
+            with open(path) as rf:
+                html = rf.read()
+            ast = self.transpiler.parser(self.transpiler.lexer(html))
+            found[module_name] = (html, ast)
+            stack.extend(reversed(collect_imports(ast)[0]))
+        return found
+
+    def compile(self, roots=None):
+        modules = OrderedDict()
+        digests = OrderedDict()
+        for module_name, (html, ast) in self.collect(roots).items():
+            logger.info("bundled: %s", module_name)
+            codegen = self.transpiler.codegen.build if self.transpiler.backend == "ast" else self.transpiler.codegen
+            modules[module_name] = compile(codegen(ast, digest=digest(html)), "<htmlpp:{}>".format(module_name), "exec")
+            digests[module_name] = digest(html)
+        payload = {
+            "version": __version__,
+            "magic": MAGIC_NUMBER,
+            "runtime": RUNTIME_VERSION,
+            "fingerprint": self.transpiler.codegen.fingerprint_digest(),
+            "modules": dict(modules),
+            "digests": dict(digests),
+        }
+        return HEADER + marshal.dumps(payload)
+
+    def write(self, path, roots=None):
+        """the bundle file, or the python module embedding it (if path ends with .py). the module names are returned"""
+        from .build import write_atomically
+        data = self.compile(roots)
+        if path.endswith(".py"):
+            write_atomically(path, MODULE_TEMPLATE.format(payload=data))
+        else:
+            write_atomically(path, data, mode="wb")
+        return list(load_bundle(data)["modules"])
+
+
+def bundle(srcdir, path, roots=None, ext=".pre.html", **codegen_options):
+    return Bundler(srcdir, ext=ext, **codegen_options).write(path, roots=roots)
+
+
+def load_bundle(data, fingerprint=None):
+    """the payload of the bundle (bytes, or the path of the file).
+    fingerprint: the digest of the codegen options (ModuleTranspiler.fingerprint_digest()), checked if passed"""
+    if not isinstance(data, bytes):
+        with open(data, "rb") as rf:
+            data = rf.read()
+    if not data.startswith(HEADER):
+        raise InvalidBundle("not a bundle")
+    try:
+        payload = marshal.loads(data[len(HEADER):])
+    except (EOFError, ValueError, TypeError) as e:
+        raise InvalidBundle("broken: {}".format(e))
+    # code objects depend on the python version, and the generated code on the runtime
+    if payload.get("magic") != MAGIC_NUMBER:
+        raise InvalidBundle("made by the other python version")
+    if payload.get("runtime") != RUNTIME_VERSION:
+        raise InvalidBundle("made by the other htmlpp runtime (runtime={!r}, version={!r})".format(
+            payload.get("runtime"), payload.get("version")
+        ))
+    if fingerprint is not None and payload.get("fingerprint") != fingerprint:
+        raise InvalidBundle("made with the other codegen options (optimize, naming, encoding, ...)")
+    return payload
+
+
+class BundleRepositoryWrapper(FrozenRepositoryWrapper):
+    """only the modules in the bundle are used, the file system is never touched (except from_string() with outdir)"""
+    def __init__(self, repository, modules):
+        super().__init__(repository, None, set(modules))
+        self.modules = modules
+
+    def load(self, module_name):
+        st = time.perf_counter()
+        module = load_module_from_code(module_name, self.modules[module_name])
+        self.repository.transpiler.observe(module_name, "load", st)
+        return module
+
+
+def get_bundle_repository(data, ext=".pre.html", cache_size=128, observer=None, **codegen_options):
+    transpiler = ModuleTranspiler(outdir=None, cache_size=cache_size, observer=observer, **codegen_options)
+    payload = load_bundle(data, fingerprint=transpiler.fingerprint_digest())
+    repository = FileSystemModuleRepository([], transpiler, ext=ext, index=ModuleIndex([], ext=ext))
+    transpiler.locate = repository.lookup_target_file_path
+    return BundleRepositoryWrapper(repository, payload["modules"])
@@ -6,7 +6,7 @@ import argparse
 def codegen(args):
     import fileinput
     from htmlpp.loader import ModuleTranspiler
-    transpiler = ModuleTranspiler()
+    transpiler = ModuleTranspiler(backend=args.backend)
     with fileinput.FileInput(args.files) as rf:
         print(transpiler.emit(u"".join(list(rf))))
 
@@ -14,8 +14,23 @@ def codegen(args):
 def render(args):
     from htmlpp.loader import get_repository
     directories = [args.directory]
+    repository = get_repository(directories, profile=args.profile)
     with open(args.file) as rf:
-        print(get_repository(directories).render(rf.read()))
+        print(repository.render(rf.read()))
+    if args.profile:
+        print(repository.profiler.report(), file=sys.stderr)
+
+
+def build(args):
+    from htmlpp.build import build
+    compiled, skipped = build(args.src, args.outdir, ext=args.ext, jobs=args.jobs, force=args.force, optimize=args.optimize)
+    print("compiled: {}, skipped: {}".format(len(compiled), len(skipped)))
+
+
+def bundle(args):
+    from htmlpp.bundle import bundle
+    module_names = bundle(args.src, args.output, roots=args.root or None, ext=args.ext, optimize=args.optimize)
+    print("bundled: {}".format(len(module_names)))
 
 
 def main(sys_args=sys.argv[1:]):
@@ -23,14 +38,33 @@ def main(sys_args=sys.argv[1:]):
     sub_parsers = parser.add_subparsers()
 
     codegen_parser = sub_parsers.add_parser("codegen")
+    codegen_parser.add_argument("--backend", choices=["source", "ast"], default="source")
     codegen_parser.add_argument("files", nargs="*")
     codegen_parser.set_defaults(func=codegen)
 
     render_parser = sub_parsers.add_parser("render")
     render_parser.add_argument("--directory", default=".")
+    render_parser.add_argument("--profile", action="store_true", help="printing the stats of each @def to stderr")
     render_parser.add_argument("file")
     render_parser.set_defaults(func=render)
 
+    build_parser = sub_parsers.add_parser("build")
+    build_parser.add_argument("src")
+    build_parser.add_argument("--outdir", required=True)
+    build_parser.add_argument("--ext", default=".pre.html")
+    build_parser.add_argument("--jobs", "-j", type=int, default=None)
+    build_parser.add_argument("--optimize", "-O", type=int, default=1)
+    build_parser.add_argument("--force", action="store_true")
+    build_parser.set_defaults(func=build)
+
+    bundle_parser = sub_parsers.add_parser("bundle")
+    bundle_parser.add_argument("src")
+    bundle_parser.add_argument("--output", "-o", required=True, help="*.py for an importable module")
+    bundle_parser.add_argument("--root", action="append", help="module name, only the reachable modules are bundled")
+    bundle_parser.add_argument("--ext", default=".pre.html")
+    bundle_parser.add_argument("--optimize", "-O", type=int, default=1)
+    bundle_parser.set_defaults(func=bundle)
+
     args = parser.parse_args(sys_args)
     try:
         func = args.func
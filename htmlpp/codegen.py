@@ -1,48 +1,178 @@
 # -*- coding:utf-8 -*-
-import time
 import pickle
+import contextlib
+from prestring import NEWLINE
 from prestring.python import PythonModule
-from io import StringIO
-from .utils import create_html_tag_regex, parse_attrs, string_from_attrs
-from .structure import FrameMap
+from .utils import create_html_tag_regex, parse_attrs, string_from_attrs, digest, _marker
+from .runtime import (  # NOQA
+    DEFAULT_CHUNK_SIZE,
+    RUNTIME_VERSION,
+    DEFAULT_NAMING,
+    codegen_fingerprint,
+    render_with,
+    iterate_chunks,
+    iterate_with,
+    render_bytes_with,
+    iterate_bytes_with,
+    encode_writer,
+    render_stream_with,
+    iterate_stream_with,
+    call_external,
+    AsyncChunkWriter,
+    render_async_with,
+    iterate_async_with,
+    call_external_async,
+)
+from .nodes import Def, PyImport
+from .inlining import Inliner, iterate_nodes
+from .graph import collect_imports
 from .exceptions import CodegenException
 
 
+
+class ConstantWrite(object):
+    """`_writer(<constant>)` statement, adjacent ones are merged into a single chunk"""
+    def __init__(self, fmt, body, encoding=None):
+        self.fmt = fmt
+        self.chunks = [body]
+        self.encoding = encoding
+
+    def __str__(self):
+        body = "".join(self.chunks)
+        if self.encoding is not None:
+            body = body.encode(self.encoding)  # encoded at compile time
+        return self.fmt.format(repr(body))
+
+
 class Codegen(object):
-    def __init__(self, naming=None):
+    backend = "source"  # see also htmlpp.astgen
+
+    """
+    optimize:
+      0 -- no optimization
+      1 -- coalescing adjacent constant writes (default)
+      2 -- inlining @def calls (resolver is needed for inlining the imported module's @def)
+      3 -- rendering at compile time, if the output is fully determined (no @pyimport)
+
+    resolver: module name -> (ast, digest) or None
+    streaming: generating generator functions (render_iter() yields chunks while rendering)
+    asynchronous: generating coroutine functions (`await render(context, send)`, send is an async sink)
+    encoding: rendering to bytes, static segments are encoded at compile time (e.g. "utf-8").
+      render() returns a bytes-like object (bytearray, or bytes if the module is pre-rendered)
+    profile: wrapping the render and block functions with counters (htmlpp.profiling), the inlined ones are not counted
+    """
+    def __init__(self, naming=None, optimize=1, resolver=None, streaming=False, asynchronous=False, encoding=None,
+                 profile=False):
+        if streaming and asynchronous:
+            raise CodegenException("streaming and asynchronous cannot be used together")
+        if encoding is not None and (streaming or asynchronous):
+            raise CodegenException("encoding cannot be used with streaming or asynchronous")
+        if profile and (streaming or asynchronous):
+            raise CodegenException("profile cannot be used with streaming or asynchronous")
         self.naming = naming
+        self.optimize = optimize
+        self.resolver = resolver
+        self.streaming = streaming
+        self.asynchronous = asynchronous
+        self.encoding = encoding
+        self.profile = profile
+        self.pyimports = set()
+        self.inliner = None
+        self.root_statements = []
+        self.constants = {}
         self.html_tag_regex = create_html_tag_regex(prefix="")
 
         if self.naming is None:
-            self.naming = dict(
-                setup="setup",
-                render_fmt="render_{}",
-                block_fmt="block_{}",
-                writer="_writer",
-                context="_context",
-                kwargs="_kwargs",
-                attributes="_attributes",
-                default_attributes="_default_attributes",
-            )
+            self.naming = dict(DEFAULT_NAMING)
+
+    def fingerprint(self):
+        """options changing the generated code (used as a part of cache key)"""
+        return codegen_fingerprint(
+            self.naming, self.optimize, self.streaming, self.asynchronous, self.encoding, self.profile, self.backend
+        )
+
+    def fingerprint_digest(self):
+        return digest(self.fingerprint())
 
-    def __call__(self, ast):
+    def __call__(self, ast, digest=None):
+        self.pyimports = set(node.alias for node in iterate_nodes(ast) if isinstance(node, PyImport))
+        self.constants = {}
+        self.hoisted = 0
         m = PythonModule()
-        m.stmt("import pickle")
+        if self.optimize < 1:
+            m.stmt("import pickle")  # the attributes are pickled
         m.stmt("from collections import OrderedDict")
-        m.stmt("from htmlpp.utils import string_from_attrs, merge_dict")
-        m.stmt("from htmlpp.codegen import render_with")
+        # generated modules depend only on htmlpp.runtime (the compiler is not imported)
+        m.stmt("from htmlpp.runtime import string_from_attrs, merge_dict, StaticAttributes, _marker, linking")
+        if self.streaming:
+            m.stmt("from htmlpp.runtime import render_stream_with, iterate_stream_with, call_external")
+        elif self.asynchronous:
+            m.stmt("from htmlpp.runtime import render_async_with, iterate_async_with, call_external_async")
+        elif self.encoding is not None:
+            m.stmt("from htmlpp.runtime import render_bytes_with, iterate_bytes_with, encode_writer")
+        else:
+            m.stmt("from htmlpp.runtime import render_with, iterate_with")
+        if self.profile:
+            m.stmt("from htmlpp.profiling import profiled")
         m.sep()
-        m.stmt("_HTMLPP_MTIME = {}".format(time.time()))
+        m.stmt("_HTMLPP_DIGEST = {!r}".format(digest))
+        m.stmt("_HTMLPP_FINGERPRINT = {!r}".format(self.fingerprint_digest()))
+        if self.encoding is not None:
+            m.stmt("_HTMLPP_ENCODING = {!r}".format(self.encoding))
+        header = m.submodule()
         m.sep()
         m.outside = m.submodule()
+        m.constants = m.outside.constants = m.outside.submodule()
+        m.hoisted = m.outside.hoisted = m.outside.submodule()
         m.storestack = m.outside.storestack = []
         with m.def_(self.naming["setup"], self.naming["context"]):
-            m.stmt("pass")
-            m.outside.setup = m.setup = m.submodule()
+            with m.with_("linking({context}, {setup})".format(context=self.naming["context"], setup=self.naming["setup"]), as_="first"):
+                with m.if_("not first"):
+                    m.stmt("return")
+                m.outside.setup = m.setup = m.submodule()
+        if self.optimize >= 2:
+            self.inliner = Inliner(self, ast, resolver=self.resolver)
         self.gencode(ast, m)
-        self.genmainfn(m)
+        content = self.get_static_content() if self.optimize >= 3 else None
+        if content is None:
+            self.genmainfn(m)
+        else:
+            self.genstaticfn(m, content)
+        imports, pyimports = collect_imports(ast)
+        if imports:
+            header.stmt("_HTMLPP_IMPORTS = {!r}".format(imports))
+        if pyimports:
+            header.stmt("_HTMLPP_PYIMPORTS = {!r}".format(pyimports))
+        if self.dependencies:
+            header.stmt("_HTMLPP_INLINED = {!r}".format(dict(sorted(self.dependencies.items()))))
         return str(m)
 
+    @property
+    def dependencies(self):
+        """the modules inlined by the last call"""
+        return self.inliner.dependencies if self.inliner is not None else {}
+
+    @contextlib.contextmanager
+    def enter_def(self, node):
+        if self.inliner is None:
+            yield
+            return
+        names = [child.name for child in node.children if isinstance(child, Def)]
+        with self.inliner.switch(toplevel=False, shadowed=names):
+            yield
+
+    def get_static_content(self):
+        """the output of render(), if it doesn't depend on anything at runtime"""
+        if not self.inliner.is_pure():
+            return None
+        chunks = []
+        for stmt in self.root_statements:
+            if isinstance(stmt, ConstantWrite):
+                chunks.extend(stmt.chunks)
+            elif stmt is not NEWLINE:
+                return None
+        return "".join(chunks)
+
     def gencode(self, node, m, attrs=None, use_pickle=False):
         if hasattr(node, "codegen"):
             # treating None as True
@@ -54,31 +184,170 @@ class Codegen(object):
         setup = self.naming["setup"]
         context = self.naming["context"]
         writer = self.naming["writer"]
-        kwargs = self.naming["kwargs"]
         fnname = self.naming["render_fmt"].format("")
+        render_with, iterate_with = "render_with", "iterate_with"
+        if self.streaming:
+            render_with, iterate_with = "render_stream_with", "iterate_stream_with"
+        elif self.encoding is not None:
+            render_with, iterate_with = "render_bytes_with", "iterate_bytes_with"
+        elif self.asynchronous:
+            with m.def_("render", context, async_=True, **{writer: None, "chunk_size": DEFAULT_CHUNK_SIZE}):
+                m.stmt('{setup}({context})'.format(setup=setup, context=context))
+                m.stmt('return await render_async_with({fnname}, {context}, {writer}={writer}, chunk_size=chunk_size)'.format(
+                    fnname=fnname, writer=writer, context=context
+                ))
+            m.sep()
+            with m.def_("render_iter", context, chunk_size=DEFAULT_CHUNK_SIZE):  # async generator
+                m.stmt('{setup}({context})'.format(setup=setup, context=context))
+                m.stmt('return iterate_async_with({fnname}, {context}, chunk_size=chunk_size)'.format(
+                    fnname=fnname, context=context
+                ))
+            return
 
         with m.def_("render", context, **{writer: None}):
             m.stmt('{setup}({context})'.format(setup=setup, context=context))
-            m.stmt('return render_with({fnname}, {context}, {writer}={writer})'.format(
-                fnname=fnname, writer=writer, context=context, kwargs=kwargs
+            m.stmt('return {render_with}({fnname}, {context}, {writer}={writer})'.format(
+                render_with=render_with, fnname=fnname, writer=writer, context=context
+            ))
+        m.sep()
+        with m.def_("render_iter", context, chunk_size=DEFAULT_CHUNK_SIZE):
+            m.stmt('{setup}({context})'.format(setup=setup, context=context))
+            m.stmt('return {iterate_with}({fnname}, {context}, chunk_size=chunk_size)'.format(
+                iterate_with=iterate_with, fnname=fnname, context=context
             ))
 
+    def def_(self, m, name, *args, **kwargs):
+        return m.def_(name, *args, async_=self.asynchronous, **kwargs)
+
+    def profile_decorator(self, m, name):
+        if self.profile:
+            m.stmt("@profiled(__name__, {!r})".format(name))
+
+    def def_keyword(self):
+        return "async def" if self.asynchronous else "def"
+
+    def params(self, *args):
+        if self.streaming:
+            return args
+        return (self.naming["writer"], ) + args
+
+    def call(self, fnname, *args):
+        if self.streaming:
+            return "yield from {}({})".format(fnname, ", ".join(args))
+        elif self.asynchronous:
+            return "await {}({})".format(fnname, ", ".join(self.params(*args)))
+        return "{}({})".format(fnname, ", ".join(self.params(*args)))
+
+    def call_external(self, fnname, *args):
+        """calling the function written in python (@pyimport)"""
+        if self.streaming:
+            return "yield from call_external({})".format(", ".join((fnname, ) + args))
+        elif self.asynchronous:
+            return "await call_external_async({})".format(", ".join((fnname, ) + self.params(*args)))
+        elif self.encoding is not None:
+            writer = "encode_writer({}, _HTMLPP_ENCODING)".format(self.naming["writer"])
+            return "{}({})".format(fnname, ", ".join((writer, ) + args))
+        return self.call(fnname, *args)
+
+    def write_stmt(self, expr, encoded=False):
+        if self.encoding is not None and not encoded:
+            expr = "{}.encode(_HTMLPP_ENCODING)".format(expr)
+        if self.streaming:
+            return "yield {}".format(expr)
+        elif self.asynchronous:
+            return "await {}({})".format(self.naming["writer"], expr)
+        return "{}({})".format(self.naming["writer"], expr)
+
+    def empty_stmt(self):
+        # generator function needs at least one yield
+        return "yield from ()" if self.streaming else "pass"
+
+    def write(self, m, body):
+        body = str(body)
+        if not body:
+            return
+        stmts = m.body.body
+        if self.optimize >= 1 and len(stmts) >= 2 and isinstance(stmts[-2], ConstantWrite) and stmts[-1] is NEWLINE:
+            stmts[-2].chunks.append(body)
+        else:
+            m.stmt(ConstantWrite(self.write_stmt("{}", encoded=True), body, encoding=self.encoding))
+
     def _codegen_text_simple(self, text, m, use_pickle=False):
         if text.strip():
-            writer = self.naming["writer"]
-            m.stmt('{writer}({body!r})'.format(writer=writer, body=str(text)))
+            self.write(m, text)
+
+    def pickled(self, attrs):
+        return 'pickle.loads({code!r})'.format(code=pickle.dumps(attrs))
+
+    def constant(self, m, expr):
+        """module level constant, evaluated only once"""
+        if expr not in self.constants:
+            self.constants[expr] = "_HTMLPP_CONST_{}".format(len(self.constants))
+            m.constants.stmt("{} = {}".format(self.constants[expr], expr))
+        return self.constants[expr]
+
+    def is_capture_free(self, block):
+        """the block uses only _writer and _context (text only, no yield and no command)"""
+        return all(not hasattr(node, "children") for node in block.children)
+
+    def hoist_block(self, m, block, block_name, label=None):
+        """defining the block function at module level (created once), or returning None if it is a closure"""
+        if self.optimize < 1 or not self.is_capture_free(block):
+            return None
+        fnname = "_{}_{}".format(block_name, self.hoisted)
+        self.hoisted += 1
+        self.profile_decorator(m.hoisted, label or block_name)
+        with self.def_(m.hoisted, fnname, *self.params(self.naming["context"])):
+            for node in block.children:
+                self.gencode(node, m.hoisted, attrs=None, use_pickle=False)
+            if block.is_empty():
+                m.hoisted.stmt(self.empty_stmt())
+        return fnname
+
+    def attributes_literal(self, attrs):
+        """the expression of attributes. StaticAttributes (if optimize >= 1), or pickled one"""
+        if self.optimize < 1:
+            return self.pickled(attrs)
+        items = ", ".join("({!r}, {})".format(k, "_marker" if v is _marker else repr(v)) for k, v in attrs.items())
+        return "StaticAttributes([{}])".format(items)
+
+    def attributes_constant(self, m, attrs):
+        if self.optimize < 1:
+            return self.pickled(attrs)
+        return self.constant(m, self.attributes_literal(attrs))
 
     def _codegen_default_attributes(self, attrs, m, use_pickle=False):
         if attrs and use_pickle:
             default_attributes = self.naming["default_attributes"]
             m.storestack[-1].body.body.pop()  # xxx
-            m.storestack[-1].body.append('pickle.loads({code!r})'.format(code=pickle.dumps(attrs)))
+            m.storestack[-1].body.append(self.attributes_literal(attrs))  # default value is evaluated only once
             m.stmt('# {} :: {!r}'.format(default_attributes, attrs))
 
-    def _codegen_text(self, text, m, passed_attrs=None, use_pickle=False):
-        writer = self.naming["writer"]
+    def default_attributes_placeholder(self):
+        return "{}" if self.optimize < 1 else self.attributes_literal({})
+
+    def _codegen_merged_attributes(self, text, match, m, defaults):
         kwargs = self.naming["kwargs"]
-        attributes = self.naming["attributes"]
+        prefix, tag, attrs_str, suffix = match.groups()
+
+        if self.optimize >= 1:
+            # defaults is StaticAttributes, merged results are memoized for each call site
+            self.write(m, "{text}<{prefix}{tag}".format(text=text[:match.start()], prefix=prefix, tag=tag))
+            m.stmt(self.write_stmt("{defaults}.render({kwargs}.attributes)".format(defaults=defaults, kwargs=kwargs)))
+            self.write(m, "{suffix}>{rest}".format(suffix=suffix, rest=text[match.end():]))
+            return
+
+        # calculating attributes before writing, for merging the text with the previous one
+        m.stmt("D = OrderedDict()")
+        m.stmt("merge_dict(D, {defaults})".format(defaults=defaults))
+        with m.if_("{kwargs}.attributes".format(kwargs=kwargs)):
+            m.stmt("merge_dict(D, {kwargs}.attributes)".format(kwargs=kwargs))
+
+        self.write(m, "{text}<{prefix}{tag}".format(text=text[:match.start()], prefix=prefix, tag=tag))
+        m.stmt(self.write_stmt("string_from_attrs(D)"))
+        self.write(m, "{suffix}>{rest}".format(suffix=suffix, rest=text[match.end():]))
+
+    def _codegen_text(self, text, m, passed_attrs=None, use_pickle=False):
         default_attributes = self.naming["default_attributes"]
 
         if not text.strip():
@@ -86,7 +355,7 @@ class Codegen(object):
 
         match = self.html_tag_regex.search(text)
         if not match:
-            m.stmt('{writer}({body!r})'.format(writer=writer, body=str(text)))
+            self.write(m, text)
             return True
 
         prefix, tag, attrs_str, suffix = match.groups()
@@ -96,38 +365,48 @@ class Codegen(object):
         if passed_attrs:
             attrs.update(passed_attrs)
 
-        m.stmt('{writer}({body!r})'.format(writer=writer, body=text[:match.start()]))
         if not prefix and use_pickle:
-            m.stmt("D = OrderedDict()")
-            m.stmt("merge_dict(D, {defaults})".format(defaults=default_attributes))
-            with m.if_("{attributes!r} in {kwargs}".format(attributes=attributes, kwargs=kwargs)):
-                m.stmt("merge_dict(D, {kwargs}[{attributes!r}])".format(attributes=attributes, kwargs=kwargs))
-
-            m.stmt('{writer}({body!r})'.format(writer=writer, body="<{prefix}{tag}".format(prefix=prefix, tag=tag)))
-            m.stmt('{writer}(string_from_attrs(D))'.format(writer=writer))
-            m.stmt('{writer}({body!r})'.format(writer=writer, body="{suffix}>{rest}".format(suffix=suffix, rest=text[match.end():])))
+            self._codegen_merged_attributes(text, match, m, default_attributes)
             return True
         else:
-            body = "<{prefix}{tag}{attrs}{suffix}>{rest}".format(
+            body = "{text}<{prefix}{tag}{attrs}{suffix}>{rest}".format(
+                text=text[:match.start()],
                 prefix=prefix,
                 tag=tag,
                 attrs=string_from_attrs(attrs),
                 suffix=suffix,
                 rest=text[match.end():]
             )
-            m.stmt('{writer}({body!r})'.format(writer=writer, body=body))
+            self.write(m, body)
             return True
 
+    def genstaticfn(self, m, content):
+        context = self.naming["context"]
+        writer = self.naming["writer"]
 
-def render_with(fn, _context, _writer=None):
-    _kwargs = FrameMap()
-    try:
-        if _writer:
-            return fn(_writer, _context, _kwargs)
-        else:
-            port = StringIO()
-            _writer = port.write
-            fn(_writer, _context, _kwargs)
-            return port.getvalue()
-    except NameError as e:
-        raise CodegenException(e.args[0])
+        etag = '"{}"'.format(digest(content))
+        if self.encoding is not None:
+            content = content.encode(self.encoding)
+        m.outside.stmt("_HTMLPP_CONTENT = {!r}".format(content))
+        m.outside.stmt("_HTMLPP_ETAG = {!r}".format(etag))
+        m.outside.sep()
+        if self.asynchronous:
+            with m.def_("render", context, async_=True, **{writer: None, "chunk_size": DEFAULT_CHUNK_SIZE}):
+                with m.if_(writer):
+                    m.stmt("await {writer}(_HTMLPP_CONTENT)".format(writer=writer))
+                    m.stmt("return None")
+                m.stmt("return _HTMLPP_CONTENT")
+            m.sep()
+            with m.def_("render_iter", context, async_=True, chunk_size=DEFAULT_CHUNK_SIZE):
+                with m.for_("i", "range(0, len(_HTMLPP_CONTENT), chunk_size)"):
+                    m.stmt("yield _HTMLPP_CONTENT[i:i + chunk_size]")
+            return
+        with m.def_("render", context, **{writer: None}):
+            with m.if_(writer):
+                m.stmt("{writer}(_HTMLPP_CONTENT)".format(writer=writer))
+                m.stmt("return None")
+            m.stmt("return _HTMLPP_CONTENT")  # shared, not copied (bytes with encoding)
+        m.sep()
+        with m.def_("render_iter", context, chunk_size=DEFAULT_CHUNK_SIZE):
+            with m.for_("i", "range(0, len(_HTMLPP_CONTENT), chunk_size)"):
+                m.stmt("yield _HTMLPP_CONTENT[i:i + chunk_size]")
@@ -13,3 +13,11 @@ class CodegenException(HTMLPPException):
 
 class NotFound(HTMLPPException):
     pass
+
+
+class CyclicImport(HTMLPPException):
+    pass
+
+
+class InvalidBundle(HTMLPPException):
+    pass
@@ -0,0 +1,69 @@
+# -*- coding:utf-8 -*-
+from .nodes import Import, PyImport
+from .inlining import iterate_nodes
+
+
+def collect_imports(ast):
+    """(template modules, python modules) imported by @import and @pyimport"""
+    imports, pyimports = [], []
+    for node in iterate_nodes(ast):
+        if isinstance(node, PyImport):
+            pyimports.append(node.module)
+        elif isinstance(node, Import):
+            imports.append(node.module)
+    return tuple(imports), tuple(pyimports)
+
+
+class DependencyGraph(object):
+    """module name -> imported module names (@import), and python modules (@pyimport)"""
+    def __init__(self):
+        self.imports = {}
+        self.pyimports = {}
+
+    def __contains__(self, module_name):
+        return module_name in self.imports
+
+    def add(self, module_name, imports=(), pyimports=()):
+        self.imports[module_name] = tuple(imports)
+        self.pyimports[module_name] = tuple(pyimports)
+
+    def discard(self, module_name):
+        self.imports.pop(module_name, None)
+        self.pyimports.pop(module_name, None)
+
+    def dependents(self, module_names):
+        """the modules importing the modules directly or transitively (the modules themselves are not included)"""
+        reverse = {}
+        for name, imports in self.imports.items():
+            for imported in imports:
+                reverse.setdefault(imported, set()).add(name)
+        seen = set()
+        stack = list(module_names)
+        while stack:
+            for name in reverse.get(stack.pop(), ()):
+                if name not in seen:
+                    seen.add(name)
+                    stack.append(name)
+        return seen.difference(module_names)
+
+    def find_cycle(self, module_name):
+        """e.g. ["a", "b", "a"], or None. not recursive (a long chain of @import must not hit the recursion limit)"""
+        path = [module_name]
+        on_path = {module_name}
+        done = set()
+        stack = [iter(self.imports.get(module_name, ()))]  # the imports not visited yet, for each module on the path
+        while stack:
+            for name in stack[-1]:
+                if name in on_path:
+                    return path[path.index(name):] + [name]
+                if name not in done:
+                    path.append(name)
+                    on_path.add(name)
+                    stack.append(iter(self.imports.get(name, ())))
+                    break
+            else:
+                stack.pop()
+                name = path.pop()
+                on_path.remove(name)
+                done.add(name)
+        return None
@@ -0,0 +1,231 @@
+# -*- coding:utf-8 -*-
+import contextlib
+from collections import OrderedDict, namedtuple
+from .nodes import Def, Yield, Command, Import, PyImport, Block
+from .utils import parse_attrs, string_from_attrs, merge_dict
+
+
+class ModuleScope(object):
+    """top level @def and @import of a module, for resolving command names at compile time"""
+    def __init__(self, name, root, digest=None):
+        self.name = name  # None is the module being compiled
+        self.digest = digest
+        self.defs = {}
+        self.imports = {}
+        self.pyimports = set()
+        for node in root.children:
+            if isinstance(node, Def):
+                self.defs[node.name] = node
+        for node in iterate_nodes(root):
+            if isinstance(node, PyImport):
+                self.pyimports.add(node.alias)
+            elif isinstance(node, Import):
+                self.imports[node.alias] = node.module
+
+
+class InlineFrame(object):
+    """compile time version of _kwargs. parent=None means the runtime _kwargs"""
+    def __init__(self, blocks, attributes, parent):
+        self.blocks = blocks  # block name -> (nodes, env)
+        self.attributes = attributes
+        self.parent = parent
+
+
+# scope: ModuleScope, frame: InlineFrame or None, shadowed: names of enclosing nested @def
+Env = namedtuple("Env", "scope frame shadowed")
+
+
+def iterate_nodes(node):
+    for child in getattr(node, "children", ()):
+        yield child
+        for grandchild in iterate_nodes(child):
+            yield grandchild
+
+
+def get_default_attributes(defnode, regex):
+    # same as the runtime: _default_attributes is the attributes of the last tag having them
+    defaults = OrderedDict()
+    for node in defnode.children:
+        if not hasattr(node, "strip") or not node.strip():
+            continue
+        match = regex.search(node)
+        if match:
+            attrs = parse_attrs(match.group(3) or "")
+            if attrs:
+                defaults = attrs
+    return defaults
+
+
+class Inliner(object):
+    def __init__(self, gen, root, resolver=None):
+        self.gen = gen
+        self.resolver = resolver
+        self.env = Env(scope=ModuleScope(None, root), frame=None, shadowed=frozenset())
+        self.toplevel = True  # in render_(), runtime _kwargs is always empty
+        self.scopes = {}
+        self.inlinable = {}
+        self.dependencies = {}  # module name -> digest of the inlined modules
+
+    @contextlib.contextmanager
+    def switch(self, env=None, toplevel=None, shadowed=None):
+        saved = self.env, self.toplevel
+        if env is not None:
+            self.env = env
+        if shadowed:
+            self.env = self.env._replace(shadowed=self.env.shadowed | frozenset(shadowed))
+        if toplevel is not None:
+            self.toplevel = toplevel
+        try:
+            yield
+        finally:
+            self.env, self.toplevel = saved
+
+    def is_pure(self):
+        """no @pyimport in the module and the imported modules (setup() has no side effect)"""
+        scopes = [self.env.scope]
+        seen = set()
+        while scopes:
+            scope = scopes.pop()
+            if scope.pyimports:
+                return False
+            for module_name in scope.imports.values():
+                if module_name in seen:
+                    continue
+                seen.add(module_name)
+                imported = self.get_scope(module_name)
+                if imported is None:
+                    return False
+                self.dependencies[module_name] = imported.digest
+                scopes.append(imported)
+        return True
+
+    def get_scope(self, module_name):
+        if module_name not in self.scopes:
+            resolved = self.resolver and self.resolver(module_name)
+            self.scopes[module_name] = resolved and ModuleScope(module_name, resolved[0], digest=resolved[1])
+        return self.scopes[module_name]
+
+    def resolve(self, name, env):
+        """(Def, ModuleScope) or None"""
+        if ":" in name:
+            alias, name = name.split(":")
+            if alias in env.scope.pyimports or alias not in env.scope.imports:
+                return None
+            scope = self.get_scope(env.scope.imports[alias])
+        elif name in env.shadowed:
+            return None
+        else:
+            scope = env.scope
+        if scope is None or name not in scope.defs:
+            return None
+        return scope.defs[name], scope
+
+    def is_inlinable(self, defnode, scope, stack=()):
+        key = (scope.name, defnode.name)
+        if key in stack:
+            return False  # recursive call
+        if key not in self.inlinable:
+            env = Env(scope=scope, frame=None, shadowed=frozenset())
+            self.inlinable[key] = all(self.is_inlinable_node(node, env, stack + (key, )) for node in defnode.children)
+        return self.inlinable[key]
+
+    def is_inlinable_node(self, node, env, stack):
+        if not hasattr(node, "children"):
+            return True
+        elif isinstance(node, Yield):
+            return True
+        elif isinstance(node, Command):
+            return self.is_inlinable_command(node, env, stack, strict=True)
+        else:
+            return False
+
+    def is_inlinable_command(self, command, env, stack=(), strict=False):
+        resolved = self.resolve(command.name, env)
+        if resolved is None or not self.is_inlinable(resolved[0], resolved[1], stack=stack):
+            return False
+        for block in command.collect_block_nodes():
+            for node in block.children:
+                if strict:
+                    if not self.is_inlinable_node(node, env, stack):
+                        return False
+                # the nodes from the runtime frame are emitted as usual, except @def (the scope is changed)
+                elif isinstance(node, (Def, Block)) or any(isinstance(x, Def) for x in iterate_nodes(node)):
+                    return False
+        return True
+
+    def inline_command(self, command, m):
+        if not self.is_inlinable_command(command, self.env, strict=self.env.frame is not None):
+            return False
+        defnode, scope = self.resolve(command.name, self.env)
+        if scope.name is not None:
+            self.dependencies[scope.name] = scope.digest
+
+        blocks = {block.name: (block.children, self.env) for block in command.collect_block_nodes()}
+        frame = InlineFrame(blocks, command.attrs or None, parent=self.env.frame)
+        defaults = get_default_attributes(defnode, self.gen.html_tag_regex)
+        with self.switch(env=Env(scope=scope, frame=frame, shadowed=frozenset())):
+            for node in defnode.children:
+                if hasattr(node, "codegen"):
+                    self.gen.gencode(node, m)
+                else:
+                    self.inline_text(node, m, defaults)
+        return True
+
+    def inline_yield(self, node, m):
+        frame = self.env.frame
+        while frame is not None:
+            if node.content_name in frame.blocks:
+                nodes, env = frame.blocks[node.content_name]
+                with self.switch(env=env):
+                    for snode in nodes:
+                        self.gen.gencode(snode, m, attrs=None, use_pickle=False)
+                return True
+            frame = frame.parent
+        return False  # looking up the runtime _kwargs
+
+    def lookup_attributes(self):
+        """static attributes, or None if it is only known at runtime"""
+        frame = self.env.frame
+        while frame is not None:
+            if frame.attributes:
+                return frame.attributes
+            frame = frame.parent
+        return OrderedDict() if self.toplevel else None
+
+    def inline_text(self, text, m, defaults):
+        gen = self.gen
+        if not text.strip():
+            return False
+        match = gen.html_tag_regex.search(text)
+        if not match:
+            gen.write(m, text)
+            return True
+
+        prefix, tag, attrs_str, suffix = match.groups()
+        if prefix:
+            body = "{text}<{prefix}{tag}{attrs}{suffix}>{rest}".format(
+                text=text[:match.start()],
+                prefix=prefix,
+                tag=tag,
+                attrs=string_from_attrs(parse_attrs(attrs_str or "")),
+                suffix=suffix,
+                rest=text[match.end():]
+            )
+            gen.write(m, body)
+            return True
+
+        attributes = self.lookup_attributes()
+        if attributes is None:
+            gen._codegen_merged_attributes(text, match, m, gen.attributes_constant(m, defaults))
+            return True
+
+        D = merge_dict(merge_dict(OrderedDict(), defaults), attributes)
+        body = "{text}<{tag}{attrs}{suffix}>{rest}".format(
+            text=text[:match.start()],
+            tag=tag,
+            attrs=string_from_attrs(D),
+            suffix=suffix,
+            rest=text[match.end():]
+        )
+        gen.write(m, body)
+        return True
@@ -3,30 +3,45 @@ from .utils import parse_attrs, create_html_tag_regex
 
 
 class Token(object):
-    pass
+    __slots__ = ("line", "column")
+
+    def position(self):
+        return "line {}, column {}".format(self.line, self.column)
 
 
 class Open(Token):
-    def __init__(self, name, attrs):
+    __slots__ = ("name", "attrs")
+
+    def __init__(self, name, attrs, line=None, column=None):
         self.name = name
         self.attrs = attrs
+        self.line = line
+        self.column = column
 
     def __repr__(self):
         return '<@{} at {}>'.format(self.name, hex(id(self)))
 
 
 class OpenClose(Token):
-    def __init__(self, name, attrs):
+    __slots__ = ("name", "attrs")
+
+    def __init__(self, name, attrs, line=None, column=None):
         self.name = name
         self.attrs = attrs
+        self.line = line
+        self.column = column
 
     def __repr__(self):
         return '<@{} at {}/>'.format(self.name, hex(id(self)))
 
 
 class Close(Token):
-    def __init__(self, name):
+    __slots__ = ("name", )
+
+    def __init__(self, name, line=None, column=None):
         self.name = name
+        self.line = line
+        self.column = column
 
     def __repr__(self):
         return '</@{} at {}>'.format(self.name, hex(id(self)))
@@ -37,33 +52,38 @@ class Lexer(object):
         self.parse_attrs = parse_attrs
         self.scanner = create_html_tag_regex(prefix=prefix)
 
-    def dispatch(self, m):
-        gs = m.groups()
-        if gs[0]:
-            return Close(gs[1])
-        elif gs[-1]:
-            return OpenClose(gs[1], self.parse_attrs(gs[2]))
+    def dispatch(self, m, line=None, column=None):
+        closing, name, attrs, selfclosing = m.groups()
+        if closing:
+            return Close(name, line, column)
+        elif selfclosing:
+            return OpenClose(name, self.parse_attrs(attrs), line, column)
         else:
-            return Open(gs[1], self.parse_attrs(gs[2]))
+            return Open(name, self.parse_attrs(attrs), line, column)
 
     def add(self, buf, x):
         if x:
             buf.append(x)
 
     def __call__(self, body):
+        # working on the offsets of the original body (same as body.strip(), but not copied)
         buf = []
-        body = body.strip()
-        search = self.scanner.scanner(body).search
-        m = None
-        end = 0
-        while True:
-            prev_m, m = m, search()
-            if m is None:
-                if prev_m is None:
-                    self.add(buf, body)
-                else:
-                    self.add(buf, prev_m.string[prev_m.end():])
-                return buf
-            self.add(buf, m.string[end:m.start()])
-            self.add(buf, self.dispatch(m))
-            end = m.end()
+        start, end = 0, len(body)
+        while start < end and body[start].isspace():
+            start += 1
+        while end > start and body[end - 1].isspace():
+            end -= 1
+
+        line, line_start, counted = 1, 0, 0  # line_start is the offset of the current line
+        for m in self.scanner.finditer(body, start, end):
+            pos = m.start()
+            self.add(buf, body[start:pos])
+            newlines = body.count("\n", counted, pos)
+            if newlines:
+                line += newlines
+                line_start = body.rfind("\n", counted, pos) + 1
+            counted = pos
+            buf.append(self.dispatch(m, line, pos - line_start + 1))
+            start = m.end()
+        self.add(buf, body[start:end])
+        return buf
@@ -2,23 +2,30 @@
 import sys
 from functools import partial
 import os.path
-import tempfile
-import shutil
 import logging
+import time
+import types
+import marshal
+from collections import Counter
 from importlib import machinery, import_module
+from importlib.util import MAGIC_NUMBER
 
+from . import __version__
 from .structure import Context
-from .exceptions import NotFound
-from .utils import Gensym
-from .lexer import Lexer
-from .parser import Parser
-from .codegen import Codegen
+from .exceptions import NotFound, CyclicImport
+from .utils import Gensym, LRUCache, digest, reify
+from .runtime import DEFAULT_CHUNK_SIZE, codegen_fingerprint
+from .graph import DependencyGraph
+from .inlining import iterate_nodes
+from .profiling import Profiler
 
 logger = logging.getLogger(__name__)
 OUTDIR = object()
 
 
 def compile_module(module_id, code, outdir=None, suffix=".py"):
+    import tempfile
+    import shutil
     outdir = outdir or tempfile.gettempdir()
     logger.debug("compiled code:\n%s", code)
     fd, path = tempfile.mkstemp()
@@ -44,43 +51,291 @@ def compile_module(module_id, code, outdir=None, suffix=".py"):
 
 
 def load_module(module_id, path):
+    # the recompiled module is loaded into a new module object, the names of the old one must not remain
+    # (e.g. _HTMLPP_IMPORTS is not emitted, if the template has no @import)
+    sys.modules.pop(module_id, None)
     return machinery.SourceFileLoader(module_id, path).load_module()
 
 
-def get_repository(directories, outdir=None, ext=".pre.html"):
+def load_module_from_code(module_id, code):
+    """in-memory loading. the module is not registered in sys.modules"""
+    module = types.ModuleType(module_id)
+    module.__file__ = code.co_filename
+    exec(code, module.__dict__)
+    return module
+
+
+def digest_file(path):
+    with open(path) as rf:
+        return digest(rf.read())
+
+
+def estimate_module_size(module):
+    """rough memory usage of the generated module (module dict, constants and code objects), in bytes"""
+    size = sys.getsizeof(module.__dict__)
+    for value in module.__dict__.values():
+        size += sys.getsizeof(value)
+        code = getattr(value, "__code__", None)
+        if code is not None:
+            size += sys.getsizeof(code) + sys.getsizeof(code.co_code) + sys.getsizeof(code.co_consts)
+    return size
+
+
+def is_modified(dependencies, locate):
+    """dependencies: module name -> digest of the source"""
+    for module_name, source_digest in dependencies.items():
+        path = locate(module_name)
+        if path is None or digest_file(path) != source_digest:
+            return True
+    return False
+
+
+def get_repository(directories, outdir=None, ext=".pre.html", cache_size=128, cachedir=None,
+                   use_index=False, index_ttl=None, frozen=False, check_interval=None, observer=None, bundle=None,
+                   **codegen_options):
+    """
+    frozen: using only the modules in outdir, compiled by `htmlpp build` (the sources are never touched)
+    bundle: using only the modules in the bundle file, made by `htmlpp bundle` (see htmlpp.bundle)
+    check_interval: the sources are checked every N seconds, instead of every first import
+    observer: callable(module_id, stage, seconds, info), called for each stage of loading (see htmlpp.tracing)
+    """
     # TODO: include also sys.site_packages?
-    if outdir is None:
+    if bundle is not None:
+        from .bundle import get_bundle_repository
+        return get_bundle_repository(bundle, cache_size=cache_size, observer=observer, **codegen_options)
+    if frozen:
+        return get_frozen_repository(outdir, ext=ext, cache_size=cache_size, observer=observer, **codegen_options)
+    if cachedir is not None or codegen_options.get("backend") == "ast":
+        # modules are loaded from cachedir, or compiled in memory (ast backend, the source text is not generated),
+        # instead of sys.path
+        if outdir is not None:
+            logger.warning("outdir=%r is not used, the modules are compiled in memory (%s)",
+                           outdir, "cachedir" if cachedir is not None else "backend='ast'")
+        outdir = None
+    elif outdir is None:
+        import tempfile
         outdir = tempfile.gettempdir()
-    transpiler = ModuleTranspiler(outdir=outdir)
-    repository = FileSystemModuleRepository(directories, transpiler, ext=ext)
-    repository = SysPathImportRepositoryWrapper(repository, outdir=outdir)
+    transpiler = ModuleTranspiler(outdir=outdir, cache_size=cache_size, cachedir=cachedir, observer=observer, **codegen_options)
+    index = ModuleIndex(directories, ext=ext, ttl=index_ttl) if use_index else None
+    repository = FileSystemModuleRepository(directories, transpiler, ext=ext, index=index)
+    transpiler.locate = repository.lookup_target_file_path
+    repository = SysPathImportRepositoryWrapper(
+        repository, outdir=outdir, file_check=check_interval is None, check_interval=check_interval
+    )
     return repository
 
 
+def get_frozen_repository(outdir, ext=".pre.html", cache_size=128, observer=None, **codegen_options):
+    from .build import MANIFEST, read_manifest, module_name_from_path
+    if outdir is None:
+        raise NotFound("{} (outdir is required for the frozen repository)".format(MANIFEST))
+    manifest = read_manifest(outdir)
+    if manifest is None:
+        raise NotFound(os.path.join(outdir, MANIFEST))
+    module_names = set(module_name_from_path(relpath, ext=ext) for relpath in manifest["files"])
+    transpiler = ModuleTranspiler(outdir=None, cache_size=cache_size, observer=observer, **codegen_options)
+    # the index of nothing, lookups never touch the file system
+    repository = FileSystemModuleRepository([], transpiler, ext=ext, index=ModuleIndex([], ext=ext))
+    transpiler.locate = repository.lookup_target_file_path
+    return FrozenRepositoryWrapper(repository, outdir, module_names)
+
+
+class BytecodeCache(object):
+    """marshalled code objects, keyed by (source hash, htmlpp version, codegen options)"""
+    suffix = ".htmlppc"
+
+    def __init__(self, cachedir):
+        self.cachedir = cachedir
+        os.makedirs(cachedir, exist_ok=True)
+
+    def get_key(self, source_digest, fingerprint):
+        # marshal format depends on the python version, so MAGIC_NUMBER is also included
+        return digest("{}:{!r}:{}:{}".format(__version__, MAGIC_NUMBER, fingerprint, source_digest))
+
+    def get_path(self, key):
+        return os.path.join(self.cachedir, key + self.suffix)
+
+    def load(self, key):
+        """(dependencies, code) or None"""
+        try:
+            with open(self.get_path(key), "rb") as rf:
+                return marshal.loads(rf.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def dump(self, key, code, dependencies):
+        import tempfile
+        fd, path = tempfile.mkstemp(dir=self.cachedir)
+        with os.fdopen(fd, "wb") as wf:
+            wf.write(marshal.dumps((dependencies, code)))
+        os.replace(path, self.get_path(key))
+
+
 class ModuleTranspiler(object):
-    def __init__(self, outdir=None):
-        self.lexer = Lexer()
-        self.parser = Parser()
-        self.codegen = Codegen()
+    """
+    backend: "source" (Codegen, generating the source text) or "ast" (AstCodegen, building ast nodes for compile(),
+      always compiled in memory). with "ast", each function has its own line number but the other nodes are on line 1,
+      so the lines in the tracebacks don't point at the failed statements (no source text to show, either)
+    """
+    def __init__(self, outdir=None, cache_size=128, cachedir=None, observer=None, backend="source", **codegen_options):
+        self.backend = backend
+        self.codegen_options = codegen_options
         self.outdir = outdir
         self.gensym = Gensym()
+        self.code_cache = LRUCache(cache_size)
+        self.bytecode_cache = BytecodeCache(cachedir) if cachedir is not None else None
+        self.observer = observer
+        self.counters = Counter()
+
+    # the compiler is imported lazily (not needed for the precompiled modules)
+    @reify
+    def lexer(self):
+        from .lexer import Lexer
+        return Lexer()
+
+    @reify
+    def parser(self):
+        from .parser import Parser
+        return Parser()
+
+    @reify
+    def codegen(self):
+        if self.backend == "ast":
+            from .astgen import AstCodegen as Codegen
+        else:
+            from .codegen import Codegen
+        return Codegen(resolver=self.parse_module, **self.codegen_options)
+
+    def observe(self, module_id, stage, started_at, **info):
+        if self.observer is not None:
+            self.observer(module_id, stage, time.perf_counter() - started_at, info)
+
+    def fingerprint_digest(self):
+        """as same as codegen.fingerprint_digest(), without importing the compiler"""
+        return digest(codegen_fingerprint(backend=self.backend, **self.codegen_options))
+
+    def locate(self, module_name):
+        """module name -> file path of the template (replaced by the repository)"""
+        return None
+
+    def parse_module(self, module_name):
+        path = self.locate(module_name)
+        if path is None:
+            return None
+        with open(path) as rf:
+            html = rf.read()
+        return self.parser(self.lexer(html)), digest(html)
 
     def load(self, module_id, path):
-        return load_module(module_id, path)
+        st = time.perf_counter()
+        module = load_module(module_id, path)
+        self.observe(module_id, "load", st)
+        return module
+
+    def import_module(self, module_name):
+        """importing the module compiled into outdir"""
+        st = time.perf_counter()
+        module = import_module(module_name)
+        self.observe(module_name, "import", st)
+        return module
 
     def __call__(self, filepath, module_id, outdir=OUTDIR):
         with open(filepath) as rf:
             return self.transpile(rf.read(), module_id, outdir=outdir)
 
     def emit(self, html):
-        return self.codegen(self.parser(self.lexer(html)))
+        return self.codegen(self.parser(self.lexer(html)), digest=digest(html))
+
+    def generate(self, html, module_id, codegen=None):
+        """emit(), reporting each stage to the observer. codegen: e.g. AstCodegen.build (returning ast.Module)"""
+        if self.observer is None:
+            if codegen is None:
+                return self.emit(html)
+            return codegen(self.parser(self.lexer(html)), digest=digest(html))
+        st = time.perf_counter()
+        tokens = self.lexer(html)
+        self.observe(module_id, "lex", st, tokens=len(tokens))
+        st = time.perf_counter()
+        ast = self.parser(tokens)
+        self.observe(module_id, "parse", st, nodes=sum(1 for _ in iterate_nodes(ast)))
+        st = time.perf_counter()
+        code = (codegen or self.codegen)(ast, digest=digest(html))
+        self.observe(module_id, "codegen", st, source_size=len(code) if isinstance(code, str) else None)
+        return code
+
+    def compile_source(self, html, module_id):
+        self.counters["compiles"] += 1  # not counted on the hits of the code cache and the bytecode cache
+        if self.backend == "ast":
+            code = self.generate(html, module_id, codegen=self.codegen.build)  # not re-parsed by compile()
+        else:
+            code = self.generate(html, module_id)
+        st = time.perf_counter()
+        compiled = compile(code, "<htmlpp:{}>".format(module_id), "exec")
+        self.observe(module_id, "compile", st)
+        return compiled
+
+    def compile(self, html, module_id):
+        # cached by the content of the template (the entries inlining the changed modules are dropped by invalidate()).
+        # module_id is not a part of the key
+        key = digest(html)
+        cached = self.code_cache.get(key)
+        if cached is None:
+            self.counters["code_cache_misses"] += 1
+            cached = self.code_cache[key] = self.load_bytecode(html, key, module_id)
+        else:
+            self.counters["code_cache_hits"] += 1
+        return cached[1]
+
+    def invalidate(self, module_names=()):
+        """dropping the cached code inlining the modules, or the modified ones (optimize >= 2).
+        called on refresh(), not on each hit. the keys (digests of the templates) of the dropped entries are returned"""
+        module_names = set(module_names)
+        modified = {}  # (module name, digest) -> bool, each inlined module is checked once
+        dropped = []
+        for key, (dependencies, code) in self.code_cache.items():
+            if not dependencies:
+                continue
+            for item in dependencies.items():
+                if item not in modified:
+                    modified[item] = item[0] in module_names or is_modified(dict([item]), self.locate)
+                if modified[item]:
+                    self.code_cache.pop(key)
+                    dropped.append(key)
+                    break
+        return dropped
+
+    def load_bytecode(self, html, key, module_id):
+        """(dependencies, code)"""
+        if self.bytecode_cache is None:
+            code = self.compile_source(html, module_id)
+            return dict(self.codegen.dependencies), code
+        st = time.perf_counter()
+        cache_key = self.bytecode_cache.get_key(key, self.codegen.fingerprint())
+        cached = self.bytecode_cache.load(cache_key)
+        if cached is not None and not is_modified(cached[0], self.locate):
+            self.counters["bytecode_cache_hits"] += 1
+            self.observe(module_id, "compile", st, cached=True)
+            return cached
+        code = self.compile_source(html, module_id)
+        dependencies = dict(self.codegen.dependencies)
+        self.bytecode_cache.dump(cache_key, code, dependencies)
+        return dependencies, code
 
     def transpile(self, html, module_id=None, outdir=OUTDIR):
         module_id = module_id or self.gensym("_htmlpp_internal")
-        code = self.emit(html)
         if outdir is OUTDIR:
             outdir = self.outdir
+        if outdir is None or self.backend == "ast":  # writing ast.unparse() for import is slower than compiling
+            code = self.compile(html, module_id)
+            st = time.perf_counter()
+            module = load_module_from_code(module_id, code)
+            self.observe(module_id, "load", st)
+            return module
+        self.counters["compiles"] += 1
+        code = self.generate(html, module_id)
+        st = time.perf_counter()
         path = compile_module(module_id, code, outdir=outdir)
+        self.observe(module_id, "write", st, path=path)
         return self.load(module_id, path)
 
 
@@ -96,10 +351,14 @@ class UseChildRepository(object):
 
 
 class SysPathImportRepositoryWrapper(UseChildRepository):
-    def __init__(self, repository, outdir=None, file_check=True):
+    def __init__(self, repository, outdir=None, file_check=True, check_interval=None):
         self.repository = repository
         self.outdir = outdir
         self.file_check = file_check
+        self.check_interval = check_interval
+        self.checked_at = time.monotonic()
+        self.string_modules = LRUCache(repository.transpiler.code_cache.maxsize)
+        self.profiler = Profiler() if repository.transpiler.codegen_options.get("profile") else None
         # side effect!!
         if outdir is not None and outdir not in sys.path:
             logger.info(os.path.abspath(outdir))
@@ -108,16 +367,50 @@ class SysPathImportRepositoryWrapper(UseChildRepository):
     def create_context(self):
         return Context({}, self)
 
+    @property
+    def graph(self):
+        return self.repository.graph
+
+    def stats(self):
+        """counters of the repository, see FileSystemModuleRepository.stats()"""
+        stats = self.repository.stats()
+        stats["string_modules"] = len(self.string_modules)
+        return stats
+
+    def profile_stats(self, by=("module", "name")):
+        """[(key, DefStats)] collected while rendering, with profile=True"""
+        if self.profiler is None:
+            raise ValueError("profiling is not enabled, get_repository(..., profile=True) is needed")
+        return self.profiler.aggregate(by)
+
+    def is_fresh(self, module, target_file_path):
+        return self.repository.is_fresh(module, target_file_path)
+
+    def check_periodically(self):
+        now = time.monotonic()
+        if now - self.checked_at >= self.check_interval:
+            self.checked_at = now
+            self.refresh()
+
     def from_module_name(self, module_name):
+        if self.check_interval is not None:
+            self.check_periodically()
+        counters = self.repository.counters
         if module_name in self.repository:
+            counters["hits"] += 1
             return self.repository[module_name]
+        counters["misses"] += 1
+        if self.outdir is None:
+            return self.repository.from_module_name(module_name)
         target_file_path = None
         try:
-            module = import_module(module_name)
+            module = self.repository.transpiler.import_module(module_name)
             if self.file_check:
                 target_file_path = self.repository.lookup_target_file_path(module_name)
-                if module._HTMLPP_MTIME <= os.stat(target_file_path).st_mtime:
+                if not self.is_fresh(module, target_file_path):
+                    counters["recompiles"] += 1  # stale
                     raise ImportError(module_name)
+            counters["imports"] += 1
             self.repository[module_name] = module
             return module
         except ImportError:
@@ -127,23 +420,168 @@ class SysPathImportRepositoryWrapper(UseChildRepository):
     __call__ = from_module_name
 
     def from_string(self, template, outdir=OUTDIR, context=None):
-        context = context or self.create_context()
+        if self.check_interval is not None:
+            self.check_periodically()  # also for render() and render_iter(), the imported modules can be changed
         outdir = outdir if outdir is not OUTDIR else self.outdir
+        if context is None and outdir is None:
+            # in-memory module is reused with its context, so setup() is run only once
+            key = digest(template)
+            module = self.string_modules.get(key)
+            if module is None:
+                module = self.repository.from_string(template, outdir=None, context=self.create_context())
+                self.string_modules[key] = module
+            return module
+        context = context or self.create_context()
         return self.repository.from_string(template, outdir=outdir, context=context)
 
     def render(self, template):
         return self.from_string(template, outdir=None).getvalue()
 
+    def render_iter(self, template, chunk_size=DEFAULT_CHUNK_SIZE):
+        module = self.from_string(template, outdir=None)
+        return module.render_iter(module.context, chunk_size=chunk_size)
+
+    def refresh(self):
+        targets = self.repository.refresh()
+        dropped = self.repository.transpiler.invalidate(targets)
+        if targets:
+            self.string_modules.clear()  # the contexts hold the old modules
+        else:
+            for key in dropped:  # keyed by the digest of the template, as same as the code cache
+                self.string_modules.pop(key)
+        return targets
+
     def clean(self):
+        self.string_modules.clear()
         self.repository.clean()
 
 
+class ModuleIndex(object):
+    """path name -> full path of the templates, built by scanning the directories once.
+    a miss is also answered without touching the file system. ttl=None means, refreshed only by refresh()
+    """
+    def __init__(self, directories, ext=".pre.html", ttl=None):
+        self.directories = directories
+        self.ext = ext
+        self.ttl = ttl
+        self.paths = None
+        self.built_at = None
+        self.scans = 0
+
+    def refresh(self):
+        self.scans += 1
+        paths = {}
+        for d in self.directories:
+            visited = set()  # (st_dev, st_ino) of the directories, a symlink loop is walked only once
+            for root, dirs, files in os.walk(d, followlinks=True):
+                st = os.stat(root)
+                if (st.st_dev, st.st_ino) in visited:
+                    dirs[:] = []
+                    continue
+                visited.add((st.st_dev, st.st_ino))
+                for name in files:
+                    if name.endswith(self.ext):
+                        fullpath = os.path.join(root, name)
+                        path_name = os.path.relpath(fullpath, d).replace(os.sep, "/")
+                        paths.setdefault(path_name, fullpath)  # the first directory is prior
+        self.paths = paths
+        self.built_at = time.monotonic()
+
+    def get(self, path_name):
+        if self.paths is None or (self.ttl is not None and time.monotonic() - self.built_at >= self.ttl):
+            self.refresh()
+        return self.paths.get(path_name)
+
+
+class FrozenRepositoryWrapper(SysPathImportRepositoryWrapper):
+    """only the modules listed in the manifest of `htmlpp build` are imported, without checking the sources"""
+    def __init__(self, repository, outdir, module_names):
+        super().__init__(repository, outdir=outdir, file_check=False)
+        self.module_names = module_names
+
+    def from_module_name(self, module_name):
+        counters = self.repository.counters
+        if module_name in self.repository:
+            counters["hits"] += 1
+            return self.repository[module_name]
+        counters["misses"] += 1
+        if module_name not in self.module_names:
+            raise NotFound(module_name)
+        module = self.load(module_name)
+        counters["imports"] += 1
+        self.repository[module_name] = module
+        return module
+
+    __call__ = from_module_name
+
+    def load(self, module_name):
+        return self.repository.transpiler.import_module(module_name)
+
+    def from_string(self, template, outdir=None, context=None):
+        return super().from_string(template, outdir=outdir, context=context)
+
+    def refresh(self):
+        return []
+
+
 class FileSystemModuleRepository(UseChildRepository):
-    def __init__(self, directoires, transpiler, ext=".pre.html"):
+    def __init__(self, directoires, transpiler, ext=".pre.html", index=None):
         self.directoires = directoires
         self.repository = {}
         self.ext = ext.lstrip(".")
         self.transpiler = transpiler
+        self.index = index
+        self.graph = DependencyGraph()
+        self.counters = Counter()  # plain increments, cheap enough to be always on
+
+    def __setitem__(self, module_name, module):
+        imports = getattr(module, "_HTMLPP_IMPORTS", ())
+        self.graph.add(module_name, imports, getattr(module, "_HTMLPP_PYIMPORTS", ()))
+        try:
+            self.check_cycle(module_name)
+        except CyclicImport:
+            self.graph.discard(module_name)
+            raise
+        self.repository[module_name] = module
+
+    def check_cycle(self, module_name):
+        # cyclic @import causes infinite recursion in setup(), so it is reported before rendering.
+        # the graph is built from _HTMLPP_IMPORTS of the registered modules (the sources are not parsed again),
+        # so the cycle is found when its last module is registered (by setup() of the first render)
+        cycle = self.graph.find_cycle(module_name)
+        if cycle is not None:
+            raise CyclicImport(" -> ".join(cycle))
+
+    def is_fresh(self, module, target_file_path):
+        if target_file_path is None:
+            return hasattr(module, "_HTMLPP_DIGEST")
+        if getattr(module, "_HTMLPP_FINGERPRINT", None) != self.transpiler.codegen.fingerprint_digest():
+            return False  # generated by the other version or with the other options
+        self.counters["digest_checks"] += 1
+        if getattr(module, "_HTMLPP_DIGEST", None) != digest_file(target_file_path):
+            return False
+        inlined = getattr(module, "_HTMLPP_INLINED", {})
+        return not is_modified(inlined, self.lookup_target_file_path)
+
+    def refresh(self):
+        """recompiling the changed modules and their dependents. the names of recompiled modules are returned"""
+        if self.index is not None:
+            self.index.refresh()
+        changed = [
+            name for name, module in self.repository.items()
+            if not self.is_fresh(module, self.lookup_target_file_path(name))
+        ]
+        targets = sorted(name for name in self.graph.dependents(changed).union(changed) if name in self.repository)
+        for name in targets:
+            del self.repository[name]
+        for name in list(self.graph.imports):
+            if name not in self.repository:
+                self.graph.discard(name)
+        for name in targets:
+            if self.lookup_target_file_path(name) is not None:
+                self.counters["recompiles"] += 1
+                self.from_module_name(name)
+        return targets
 
     def create_context(self):
         return Context({}, self)
@@ -154,8 +592,11 @@ class FileSystemModuleRepository(UseChildRepository):
 
     def lookup_target_file_path(self, module_name):
         path_name = self.get_path_name(module_name)
+        if self.index is not None:
+            return self.index.get(path_name)
         for d in self.directoires:
             fullpath = os.path.join(d, path_name)
+            self.counters["stat_calls"] += 1
             if os.path.exists(fullpath):
                 return fullpath
         return None
@@ -168,7 +609,7 @@ class FileSystemModuleRepository(UseChildRepository):
         if fullpath is None:
             raise NotFound(module_name)
         module = self.transpiler(fullpath, module_name)
-        self.repository[module_name] = module
+        self[module_name] = module
         return module
 
     __call__ = from_module_name
@@ -182,5 +623,33 @@ class FileSystemModuleRepository(UseChildRepository):
     def render(self, template):
         return self.from_string(template, outdir=None).getvalue()
 
+    def render_iter(self, template, chunk_size=DEFAULT_CHUNK_SIZE):
+        module = self.from_string(template, outdir=None)
+        return module.render_iter(module.context, chunk_size=chunk_size)
+
+    def stats(self):
+        """
+        hits/misses: lookups of the loaded modules (by the wrapper)
+        imports: modules imported from outdir (compiled before)
+        compiles: templates compiled (the hits of the caches are not included), recompiles: stale or changed modules compiled again
+        stat_calls: os.path.exists() on looking up the templates, index_scans: directory walks of the index
+        digest_checks: templates read for checking the freshness
+        code_cache_*, bytecode_cache_hits: the caches of the in-memory modules (from_string(), cachedir)
+        memory: estimated size of each loaded module (bytes)
+        """
+        stats = dict.fromkeys([
+            "hits", "misses", "imports", "compiles", "recompiles", "stat_calls", "digest_checks",
+            "code_cache_hits", "code_cache_misses", "bytecode_cache_hits",
+        ], 0)
+        stats.update(self.counters)
+        stats.update(self.transpiler.counters)
+        stats["modules"] = len(self.repository)
+        stats["index_scans"] = self.index.scans if self.index is not None else 0
+        stats["code_cache_size"] = len(self.transpiler.code_cache)
+        stats["memory"] = {name: estimate_module_size(module) for name, module in self.repository.items()}
+        stats["memory_total"] = sum(stats["memory"].values())
+        return stats
+
     def clean(self):
         self.repository = {}
+        self.graph = DependencyGraph()
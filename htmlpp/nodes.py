@@ -1,6 +1,6 @@
 # -*- coding:utf-8 -*-
 from .utils import get_unquoted_string
-import pickle
+from .structure import ATTRIBUTES
 
 
 class Node(object):
@@ -31,40 +31,42 @@ class Node(object):
 class _Root(Node):
     def codegen(self, gen, m, attrs=None):
         fnname = gen.naming["render_fmt"].format("")
-        writer = gen.naming["writer"]
         context = gen.naming["context"]
         kwargs = gen.naming["kwargs"]
         default_attributes = gen.naming["default_attributes"]
 
-        with m.def_(fnname, writer, context, kwargs, **{default_attributes: "{}"}):
+        gen.profile_decorator(m, fnname)
+        with gen.def_(m, fnname, *gen.params(context, kwargs), **{default_attributes: "{}"}):
             is_emitted = False
+            start = len(m.body.body)
             for node in self.children:
                 if isinstance(node, Def):
                     gen.gencode(node, m.outside, use_pickle=False)
                 else:
                     is_emitted = gen.gencode(node, m, use_pickle=False) or is_emitted
+            gen.root_statements = m.body.body[start:]
             if not is_emitted:
-                m.stmt("pass")
+                m.stmt(gen.empty_stmt())
 
 
 class Def(Node):
     def codegen(self, gen, m, attrs=None):
         fnname = gen.naming["render_fmt"].format(self.name)
-        writer = gen.naming["writer"]
         context = gen.naming["context"]
         kwargs = gen.naming["kwargs"]
         defaults = gen.naming["default_attributes"]
 
-        m.body.append("def {}({}, {}, {}, {}=".format(fnname, writer, context, kwargs, defaults))
-        m.storestack.append(m.submodule("{}", newline=False))
+        gen.profile_decorator(m, fnname)
+        m.body.append("{} {}({}, {}=".format(gen.def_keyword(), fnname, ", ".join(gen.params(context, kwargs)), defaults))
+        m.storestack.append(m.submodule(gen.default_attributes_placeholder(), newline=False))
         m.stmt("):")
-        with m.scope():
+        with m.scope(), gen.enter_def(self):
             m.stmt("")
             is_emitted = False
             for node in self.children:
                 is_emitted = gen.gencode(node, m, attrs=attrs, use_pickle=True) or is_emitted
             if not is_emitted:
-                m.stmt("pass")
+                m.stmt(gen.empty_stmt())
         m.storestack.pop()
         m.sep()
 
@@ -75,14 +77,13 @@ class Yield(Node):
         return get_unquoted_string(self.attrs.get("name")) or "body"
 
     def codegen(self, gen, m, attrs=None):
+        if gen.inliner is not None and gen.inliner.inline_yield(self, m):
+            return
         fnname = gen.naming["block_fmt"].format(self.content_name)
-        writer = gen.naming["writer"]
         context = gen.naming["context"]
         kwargs = gen.naming["kwargs"]
 
-        m.stmt('{kwargs}["{fnname}"]({writer}, {context})'.format(
-            fnname=fnname, writer=writer, context=context, kwargs=kwargs
-        ))
+        m.stmt(gen.call('{kwargs}.blocks["{fnname}"]'.format(fnname=fnname, kwargs=kwargs), context))
 
 
 class Import(Node):
@@ -154,39 +155,45 @@ class Command(Node):
         return block_nodes
 
     def codegen(self, gen, m, attrs=None):
-        writer = gen.naming["writer"]
+        if gen.inliner is not None and gen.inliner.inline_command(self, m):
+            return
         context = gen.naming["context"]
         kwargs = gen.naming["kwargs"]
         attributes = gen.naming["attributes"]
 
-        m.stmt('new_{kwargs} = {kwargs}.new_child()  # kwargs is ChainMap'.format(
-            kwargs=kwargs
-        ))
+        blocks = []
         for node in self.collect_block_nodes():
             block_name = gen.naming["block_fmt"].format(node.name)
-            with m.def_(block_name, writer, context):
-                for snode in node.children:
-                    gen.gencode(snode, m, attrs=None, use_pickle=False)
-                if node.is_empty():
-                    m.stmt("pass")
-            m.stmt('new_{kwargs}["{fnname}"] = {fnname}'.format(
-                kwargs=kwargs, fnname=block_name
-            ))
-
+            label = "{}@{}".format(block_name, self.name)  # the block passed to the command
+            fnname = gen.hoist_block(m, node, block_name, label=label)
+            if fnname is None:
+                fnname = block_name
+                gen.profile_decorator(m, label)
+                with gen.def_(m, block_name, *gen.params(context)):
+                    for snode in node.children:
+                        gen.gencode(snode, m, attrs=None, use_pickle=False)
+                    if node.is_empty():
+                        m.stmt(gen.empty_stmt())
+            blocks.append("{!r}: {}".format(block_name, fnname))
+
+        args = ["{" + ", ".join(blocks) + "}"]
         if self.attrs:
             m.stmt("# {attributes} :: {code!r}".format(attributes=attributes, code=self.attrs))
-            m.stmt("new_{kwargs}[{attributes!r}] = pickle.loads({code!r})".format(
-                kwargs=kwargs, attributes=attributes, code=pickle.dumps(self.attrs)
-            ))
+            args.append(gen.attributes_constant(m, self.attrs))
+        if attributes != ATTRIBUTES:
+            args.append("name={!r}".format(attributes))  # the key of Frame's mapping interface
+        m.stmt('new_{kwargs} = {kwargs}.child({args})'.format(kwargs=kwargs, args=", ".join(args)))
 
+        new_kwargs = "new_{kwargs}".format(kwargs=kwargs)
         if self.is_module_access(self.name):
             module_name, name = self.name.split(":")
-            fnname = gen.naming["render_fmt"].format(name)
-            m.stmt('{context}[{module_name!r}].{fnname}({writer}, {context}, new_{kwargs})'.format(
-                fnname=fnname, writer=writer, context=context, kwargs=kwargs, module_name=module_name
-            ))
+            fnname = '{context}[{module_name!r}].{fnname}'.format(
+                context=context, module_name=module_name, fnname=gen.naming["render_fmt"].format(name)
+            )
+            if module_name in gen.pyimports:
+                m.stmt(gen.call_external(fnname, context, new_kwargs))
+            else:
+                m.stmt(gen.call(fnname, context, new_kwargs))
         else:
             fnname = gen.naming["render_fmt"].format(self.name)
-            m.stmt('{fnname}({writer}, {context}, new_{kwargs})'.format(
-                fnname=fnname, writer=writer, context=context, kwargs=kwargs
-            ))
+            m.stmt(gen.call(fnname, context, new_kwargs))
@@ -72,20 +72,25 @@ class Parser(object):
         return isinstance(token, OpenClose)
 
     def _construct(self, stack, iterator):
+        opened = []  # open tokens, for error message
         for token in iterator:
             if self.is_open(token):
                 newnode = self.create_node(token)
                 stack[-1].add_child(newnode)
                 stack.append(newnode)
+                opened.append(token)
             elif self.is_close(token):
+                if len(stack) == 1:
+                    raise ParseException("unmatched tag: </@{}> ({})".format(token.name, token.position()))
                 stack.pop()
+                opened.pop()
             elif self.is_openclose(token):
                 newnode = self.create_node(token)
                 stack[-1].add_child(newnode)
             else:
                 stack[-1].add_child(token)
         if len(stack) != 1:
-            raise ParseException("unmatched tag: stack={}".format(stack))
+            raise ParseException("unmatched tag: stack={} ({})".format(stack, opened[-1].position()))
 
 
 Parser.register(Def)
@@ -0,0 +1,117 @@
+# -*- coding:utf-8 -*-
+import threading
+from functools import wraps
+from time import perf_counter
+
+
+class DefStats(object):
+    """
+    calls: the number of calls
+    inclusive: seconds, including the nested calls
+    exclusive: seconds, excluding the nested (profiled) calls
+    written: the size of the written chunks (characters, or bytes with encoding), including the nested calls
+    """
+    __slots__ = ("calls", "inclusive", "exclusive", "written")
+
+    def __init__(self):
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+        self.written = 0
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.inclusive += other.inclusive
+        self.exclusive += other.exclusive
+        self.written += other.written
+
+    def __repr__(self):
+        return "<DefStats calls={} inclusive={:.6f} exclusive={:.6f} written={}>".format(
+            self.calls, self.inclusive, self.exclusive, self.written
+        )
+
+
+class Profiler(object):
+    """per (module, name, caller) counters, collected by the functions decorated with `profiled`.
+    caller is "<module>:<name>" of the profiled function calling it, or None"""
+    fields = ("module", "name", "caller")
+
+    def __init__(self):
+        self.stats = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    @property
+    def stack(self):
+        try:
+            return self.local.stack
+        except AttributeError:
+            self.local.stack = []
+            return self.local.stack
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+    def call(self, module, name, fn, writer, *args):
+        stack = self.stack
+        key = (module, name, stack[-1][0] if stack else None)
+        frame = ["{}:{}".format(module, name), 0.0]  # [caller name, time of children]
+        written = 0
+
+        def counting_writer(s):
+            nonlocal written
+            written += len(s)
+            return writer(s)
+
+        stack.append(frame)
+        st = perf_counter()
+        try:
+            return fn(counting_writer, *args)
+        finally:
+            elapsed = perf_counter() - st
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            with self.lock:
+                stats = self.stats.get(key)
+                if stats is None:
+                    stats = self.stats[key] = DefStats()
+                stats.calls += 1
+                stats.inclusive += elapsed
+                stats.exclusive += elapsed - frame[1]
+                stats.written += written
+
+    def aggregate(self, by=("module", "name")):
+        """[(key, DefStats)], grouped by the fields and sorted by inclusive time"""
+        indices = [self.fields.index(field) for field in by]
+        grouped = {}
+        with self.lock:
+            for key, stats in self.stats.items():
+                k = tuple(key[i] for i in indices)
+                if k not in grouped:
+                    grouped[k] = DefStats()
+                grouped[k].merge(stats)
+        return sorted(grouped.items(), key=lambda item: item[1].inclusive, reverse=True)
+
+    def report(self, by=("module", "name"), limit=None):
+        lines = ["{:>8} {:>12} {:>12} {:>10}  {}".format("calls", "inclusive", "exclusive", "written", " ".join(by))]
+        for key, stats in self.aggregate(by)[:limit]:
+            lines.append("{:>8} {:>12.6f} {:>12.6f} {:>10}  {}".format(
+                stats.calls, stats.inclusive, stats.exclusive, stats.written, " ".join(str(x) for x in key)
+            ))
+        return "\n".join(lines)
+
+
+def profiled(module, name):
+    """decorator for the generated render and block functions (Codegen(profile=True)).
+    counted only when the context has a profiler"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(_writer, _context, *args):
+            profiler = getattr(_context, "profiler", None)
+            if profiler is None:
+                return fn(_writer, _context, *args)
+            return profiler.call(module, name, fn, _writer, _context, *args)
+        return wrapper
+    return decorator
@@ -0,0 +1,200 @@
+# -*- coding:utf-8 -*-
+"""
+the runtime of the generated modules. precompiled modules import only this module
+(and the compiler, e.g. prestring, is never imported for rendering them)
+"""
+from io import StringIO
+from .utils import string_from_attrs, merge_dict, StaticAttributes, _marker  # NOQA
+from .structure import Frame, linking, ATTRIBUTES  # NOQA
+from .exceptions import CodegenException
+
+DEFAULT_CHUNK_SIZE = 8192
+RUNTIME_VERSION = 5  # incremented when the generated code requires the different runtime (e.g. Frame)
+DEFAULT_NAMING = dict(
+    setup="setup",
+    render_fmt="render_{}",
+    block_fmt="block_{}",
+    writer="_writer",
+    context="_context",
+    kwargs="_kwargs",
+    attributes=ATTRIBUTES,
+    default_attributes="_default_attributes",
+)
+
+
+def codegen_fingerprint(naming=None, optimize=1, streaming=False, asynchronous=False, encoding=None, profile=False,
+                        backend="source"):
+    """options changing the generated code (used as a part of cache key). defined here, to be checked
+    on loading the precompiled modules without importing the compiler (see Codegen.fingerprint())"""
+    fingerprint = "runtime={!r}, naming={!r}, optimize={!r}, streaming={!r}, asynchronous={!r}, encoding={!r}".format(
+        RUNTIME_VERSION, sorted((naming or DEFAULT_NAMING).items()), optimize, streaming, asynchronous, encoding
+    )
+    if profile:
+        fingerprint += ", profile=True"  # without profile, the same as before
+    if backend != "source":
+        fingerprint += ", backend={!r}".format(backend)
+    return fingerprint
+
+
+def render_with(fn, _context, _writer=None):
+    _kwargs = Frame()
+    try:
+        if _writer:
+            return fn(_writer, _context, _kwargs)
+        else:
+            port = StringIO()
+            _writer = port.write
+            fn(_writer, _context, _kwargs)
+            return port.getvalue()
+    except NameError as e:
+        raise CodegenException(e.args[0])
+
+
+def iterate_chunks(iterable, chunk_size=DEFAULT_CHUNK_SIZE, empty=""):
+    buf = []
+    size = 0
+    for s in iterable:
+        buf.append(s)
+        size += len(s)
+        if size >= chunk_size:
+            yield empty.join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield empty.join(buf)
+
+
+def iterate_with(fn, _context, chunk_size=DEFAULT_CHUNK_SIZE):
+    # the render function is not a generator, so chunks are yielded after rendering
+    buf = []
+    render_with(fn, _context, _writer=buf.append)
+    return iterate_chunks(buf, chunk_size=chunk_size)
+
+
+def render_bytes_with(fn, _context, _writer=None):
+    """_writer is a binary writer (e.g. `wfile.write`). if it is not passed, bytearray is returned
+    (the pre-rendered modules return the bytes constant, so the result should be treated as a bytes-like object)"""
+    _kwargs = Frame()
+    try:
+        if _writer:
+            return fn(_writer, _context, _kwargs)
+        else:
+            buf = bytearray()
+            fn(buf.extend, _context, _kwargs)
+            return buf
+    except NameError as e:
+        raise CodegenException(e.args[0])
+
+
+def iterate_bytes_with(fn, _context, chunk_size=DEFAULT_CHUNK_SIZE):
+    buf = []
+    render_bytes_with(fn, _context, _writer=buf.append)
+    return iterate_chunks(buf, chunk_size=chunk_size, empty=b"")
+
+
+def encode_writer(writer, encoding):
+    """for the function written in python (@pyimport), it writes str"""
+    return lambda s: writer(s.encode(encoding))
+
+
+def render_stream_with(fn, _context, _writer=None):
+    _kwargs = Frame()
+    try:
+        if _writer:
+            for s in fn(_context, _kwargs):
+                _writer(s)
+        else:
+            return "".join(fn(_context, _kwargs))
+    except NameError as e:
+        raise CodegenException(e.args[0])
+
+
+def iterate_stream_with(fn, _context, chunk_size=DEFAULT_CHUNK_SIZE):
+    _kwargs = Frame()
+    try:
+        for chunk in iterate_chunks(fn(_context, _kwargs), chunk_size=chunk_size):
+            yield chunk
+    except NameError as e:
+        raise CodegenException(e.args[0])
+
+
+def call_external(fn, _context, _kwargs):
+    """calling the (not generator) function from generated code in streaming mode"""
+    buf = []
+    fn(buf.append, _context, _kwargs)
+    return buf
+
+
+class AsyncChunkWriter(object):
+    """aggregating the fragments, and awaiting the sink per chunk (backpressure)"""
+    def __init__(self, sink, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.sink = sink
+        self.chunk_size = chunk_size
+        self.buf = []
+        self.size = 0
+
+    async def __call__(self, s):
+        self.buf.append(s)
+        self.size += len(s)
+        if self.size >= self.chunk_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self.buf:
+            return
+        chunk = "".join(self.buf)
+        self.buf = []
+        self.size = 0
+        await self.sink(chunk)
+
+
+async def render_async_with(fn, _context, _writer=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    import asyncio  # heavy, imported only if needed
+    _kwargs = Frame()
+    buf = []
+    sink = _writer
+    if sink is None:
+        async def _writer(chunk):
+            buf.append(chunk)
+            await asyncio.sleep(0)  # giving the other tasks a chance to run
+    writer = AsyncChunkWriter(_writer, chunk_size=chunk_size)
+    try:
+        await fn(writer, _context, _kwargs)
+        await writer.flush()
+    except NameError as e:
+        raise CodegenException(e.args[0])
+    if sink is None:
+        return "".join(buf)
+
+
+async def iterate_async_with(fn, _context, chunk_size=DEFAULT_CHUNK_SIZE):
+    """async generator, yielding the chunks while rendering (the rendering waits until the chunk is consumed)"""
+    import asyncio
+    queue = asyncio.Queue(maxsize=1)
+    task = asyncio.ensure_future(render_async_with(fn, _context, _writer=queue.put, chunk_size=chunk_size))
+    getter = None
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait([getter, task], return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                break
+            yield getter.result()
+        while not queue.empty():
+            yield queue.get_nowait()
+        await task  # raising the error of the rendering
+    finally:
+        for future in (getter, task):
+            if future is not None and not future.done():
+                future.cancel()
+
+
+async def call_external_async(fn, _writer, _context, _kwargs):
+    """calling the function written in python from generated code in asynchronous mode, coroutine function is awaited"""
+    import inspect
+    buf = []
+    result = fn(buf.append, _context, _kwargs)
+    if inspect.isawaitable(result):
+        await result
+    for s in buf:
+        await _writer(s)
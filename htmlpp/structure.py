@@ -1,19 +1,102 @@
 # -*- coding:utf-8 -*-
-from collections import ChainMap
+import threading
 from .exceptions import CodegenException
 
 
-class FrameMap(ChainMap):
+ATTRIBUTES = "_attributes"  # the default of naming["attributes"]
+
+
+class Blocks(dict):
+    __slots__ = ()
+
     def __missing__(self, k):
         e = CodegenException("{} is not registered".format(k))
         e.key = k
         raise e
 
 
+class Frame(object):
+    """_kwargs of the render functions. the blocks and attributes of the callers are flattened,
+    so lookups don't depend on the depth of nesting. name: the key of the attributes (naming["attributes"])"""
+    __slots__ = ("blocks", "attributes", "name")
+
+    def __init__(self, blocks=None, attributes=None, name=ATTRIBUTES):
+        self.blocks = Blocks() if blocks is None else blocks
+        self.attributes = attributes
+        self.name = name
+
+    def child(self, blocks=None, attributes=None, name=None):
+        if blocks:
+            merged = Blocks(self.blocks)
+            merged.update(blocks)
+        else:
+            merged = self.blocks  # shared, never updated
+        return Frame(merged, self.attributes if attributes is None else attributes, self.name if name is None else name)
+
+    # mapping interface (for the functions written in python)
+    def __getitem__(self, k):
+        if k == self.name:
+            if self.attributes is None:
+                return self.blocks[k]
+            return self.attributes
+        return self.blocks[k]
+
+    def __contains__(self, k):
+        if k == self.name:
+            return self.attributes is not None
+        return k in self.blocks
+
+    def get(self, k, default=None):
+        return self[k] if k in self else default
+
+
+class linking(object):
+    """`with linking(context, setup) as first:`, first is True if setup() of the module has to be run with the context.
+
+    the module is marked as linked after setup() succeeds (if it fails, setup() is retried at the next render).
+    while it is running, the other threads wait for it, and the nested call in the same thread (cyclic @import) is skipped
+    """
+    __slots__ = ("context", "setup", "lock", "running")
+
+    def __init__(self, context, setup):
+        self.context = context
+        self.setup = setup
+        self.lock = None
+        self.running = False
+
+    def __enter__(self):
+        context = self.context
+        linked = getattr(context, "linked", None)
+        if linked is None:
+            return True  # e.g. dict
+        if self.setup in linked:
+            return False
+        self.lock = context.linking
+        self.lock.acquire()
+        if self.setup in linked or self.setup in context.pending:
+            return False
+        context.pending.add(self.setup)
+        self.running = True
+        return True
+
+    def __exit__(self, typ, val, tb):
+        if self.running:
+            self.context.pending.discard(self.setup)
+            if typ is None:
+                self.context.linked.add(self.setup)
+        if self.lock is not None:
+            self.lock.release()
+        return False
+
+
 class Context(object):
     def __init__(self, d, repository):
         self.d = d
         self.repository = repository
+        self.linked = set()  # setup functions already run, imports are resolved only once
+        self.pending = set()  # setup functions running (see linking)
+        self.linking = threading.RLock()
+        self.profiler = getattr(repository, "profiler", None)  # htmlpp.profiling.Profiler, if profile=True
 
     def import_module(self, module_name, alias):
         module = self.d.get(alias)
@@ -0,0 +1,210 @@
+# -*- coding:utf-8 -*-
+import os.path
+import shutil
+import tempfile
+import unittest
+import evilunit
+
+
+@evilunit.test_target("htmlpp.build:Builder")
+class BuilderTests(unittest.TestCase):
+    def setUp(self):
+        self.srcdir = tempfile.mkdtemp()
+        self.outdir = tempfile.mkdtemp()
+        self._write("lib/tags", '<@def name="box"><div class="box"><@yield/></div></@def>')
+        self._write("main", '<@import module="lib.tags" alias="t"/><@t:box>hmm</@t:box>')
+
+    def tearDown(self):
+        shutil.rmtree(self.srcdir)
+        shutil.rmtree(self.outdir)
+
+    def _write(self, module_name, html):
+        path = os.path.join(self.srcdir, *module_name.split(".")) + ".pre.html"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as wf:
+            wf.write(html)
+
+    def _makeOne(self, **kwargs):
+        return self._getTarget()(self.srcdir, self.outdir, jobs=1, **kwargs)
+
+    def test_it(self):
+        compiled, skipped = self._makeOne().build()
+        self.assertEqual(sorted(compiled), ["lib/tags.pre.html", "main.pre.html"])
+        self.assertEqual(skipped, [])
+        self.assertTrue(os.path.exists(os.path.join(self.outdir, "lib", "__init__.py")))
+        self.assertTrue(os.path.exists(os.path.join(self.outdir, "lib", "tags.py")))
+
+    def test_unchanged_files_are_skipped(self):
+        self._makeOne().build()
+        self._write("lib/tags", '<@def name="box"><p class="box"><@yield/></p></@def>')
+        compiled, skipped = self._makeOne().build()
+        self.assertEqual(compiled, ["lib/tags.pre.html"])
+        self.assertEqual(skipped, ["main.pre.html"])
+
+    def test_inlined_dependency_is_recompiled(self):
+        self._makeOne(optimize=2).build()
+        self._write("lib/tags", '<@def name="box"><p class="box"><@yield/></p></@def>')
+        compiled, skipped = self._makeOne(optimize=2).build()
+        self.assertEqual(sorted(compiled), ["lib/tags.pre.html", "main.pre.html"])
+
+    def test_changing_options__rebuilt(self):
+        self._makeOne().build()
+        compiled, skipped = self._makeOne(optimize=0).build()
+        self.assertEqual(len(compiled), 2)
+
+    def test_removed_source(self):
+        self._makeOne().build()
+        os.unlink(os.path.join(self.srcdir, "main.pre.html"))
+        self._makeOne().build()
+        self.assertFalse(os.path.exists(os.path.join(self.outdir, "main.py")))
+
+    def test_loading_built_modules(self):
+        import sys
+        from htmlpp.loader import get_repository
+        self._makeOne().build()
+        repository = get_repository([self.srcdir], outdir=self.outdir)
+        self.addCleanup(sys.path.remove, self.outdir)
+        for name in ["main", "lib", "lib.tags"]:
+            self.addCleanup(sys.modules.pop, name, None)
+        module = repository("main")
+        self.assertEqual(os.path.dirname(module.__file__), self.outdir)
+        self.assertEqual(module.render(repository.create_context()), '<div class="box">hmm</div>')
+
+    def test_process_pool(self):
+        compiled, skipped = self._getTarget()(self.srcdir, self.outdir, jobs=2).build()
+        self.assertEqual(len(compiled), 2)
+        compiled, skipped = self._getTarget()(self.srcdir, self.outdir, jobs=2).build()
+        self.assertEqual(len(skipped), 2)
+
+
+class FrozenRepositoryTests(unittest.TestCase):
+    def setUp(self):
+        import sys
+        self.srcdir = tempfile.mkdtemp()
+        self.outdir = tempfile.mkdtemp()
+        for name, html in [
+                ("lib/tags", '<@def name="box"><div class="box"><@yield/></div></@def>'),
+                ("main", '<@import module="lib.tags" alias="t"/><@t:box>hmm</@t:box>')
+        ]:
+            path = os.path.join(self.srcdir, name + ".pre.html")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as wf:
+                wf.write(html)
+        for name in ["main", "lib", "lib.tags"]:
+            self.addCleanup(sys.modules.pop, name, None)
+
+    def tearDown(self):
+        import sys
+        shutil.rmtree(self.srcdir, ignore_errors=True)
+        shutil.rmtree(self.outdir)
+        if self.outdir in sys.path:
+            sys.path.remove(self.outdir)
+
+    def _makeOne(self):
+        from htmlpp.loader import get_repository
+        return get_repository([self.srcdir], outdir=self.outdir, frozen=True)
+
+    def test_sources_are_not_used(self):
+        from htmlpp.build import build
+        from htmlpp.exceptions import NotFound
+        build(self.srcdir, self.outdir, jobs=1)
+        shutil.rmtree(self.srcdir)
+        repository = self._makeOne()
+        module = repository("main")
+        self.assertEqual(module.render(repository.create_context()), '<div class="box">hmm</div>')
+        self.assertEqual(repository.render('<@import module="lib.tags" alias="t"/><@t:box>x</@t:box>'), '<div class="box">x</div>')
+        with self.assertRaises(NotFound):
+            repository("other")
+
+    def test_without_manifest(self):
+        from htmlpp.exceptions import NotFound
+        with self.assertRaises(NotFound):
+            self._makeOne()
+
+    def test_without_outdir(self):
+        from htmlpp.loader import get_repository
+        from htmlpp.exceptions import NotFound
+        with self.assertRaises(NotFound):
+            get_repository([self.srcdir], frozen=True)
+
+
+class BundleTests(unittest.TestCase):
+    def setUp(self):
+        self.srcdir = tempfile.mkdtemp()
+        self.outdir = tempfile.mkdtemp()
+        for name, html in [
+                ("lib/tags", '<@def name="box"><div class="box"><@yield/></div></@def>'),
+                ("main", '<@import module="lib.tags" alias="t"/><@t:box>hmm</@t:box>'),
+                ("other", '<p>other</p>'),
+        ]:
+            path = os.path.join(self.srcdir, name + ".pre.html")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as wf:
+                wf.write(html)
+
+    def tearDown(self):
+        shutil.rmtree(self.srcdir, ignore_errors=True)
+        shutil.rmtree(self.outdir)
+
+    def _callFUT(self, *args, **kwargs):
+        from htmlpp.bundle import bundle
+        return bundle(self.srcdir, *args, **kwargs)
+
+    def test_bundle_file(self):
+        from htmlpp.loader import get_repository
+        from htmlpp.exceptions import NotFound
+        path = os.path.join(self.outdir, "templates.htmlppz")
+        self.assertEqual(self._callFUT(path, roots=["main"]), ["main", "lib.tags"])
+        shutil.rmtree(self.srcdir)
+
+        repository = get_repository([], bundle=path)
+        module = repository("main")
+        self.assertEqual(module.render(repository.create_context()), '<div class="box">hmm</div>')
+        self.assertEqual(repository.render('<@import module="lib.tags" alias="t"/><@t:box>x</@t:box>'), '<div class="box">x</div>')
+        with self.assertRaises(NotFound):
+            repository("other")
+        self.assertEqual(repository.stats()["stat_calls"], 0)
+
+    def test_bundle_module(self):
+        import sys
+        path = os.path.join(self.outdir, "templates_bundle.py")
+        self.assertEqual(sorted(self._callFUT(path)), ["lib.tags", "main", "other"])
+        sys.path.insert(0, self.outdir)
+        self.addCleanup(sys.path.remove, self.outdir)
+        self.addCleanup(sys.modules.pop, "templates_bundle", None)
+
+        import templates_bundle
+        repository = templates_bundle.get_repository()
+        self.assertEqual(repository.render('<@import module="other"/>'), '')
+        self.assertEqual(repository("other").render(repository.create_context()), '<p>other</p>')
+
+    def test_invalid(self):
+        from htmlpp.bundle import load_bundle
+        from htmlpp.exceptions import InvalidBundle
+        with self.assertRaises(InvalidBundle):
+            load_bundle(b"<p>hmm</p>")
+
+    def test_fingerprint(self):
+        from htmlpp.loader import get_repository
+        from htmlpp.exceptions import InvalidBundle
+        path = os.path.join(self.outdir, "templates.htmlppz")
+        self._callFUT(path, optimize=2)
+        with self.assertRaisesRegex(InvalidBundle, "codegen options"):
+            get_repository([], bundle=path)
+        repository = get_repository([], bundle=path, optimize=2)
+        self.assertEqual(repository("other").render(repository.create_context()), '<p>other</p>')
+
+    def test_fingerprint__without_compiler(self):
+        from htmlpp.loader import ModuleTranspiler
+        for options in [{}, {"optimize": 2}, {"backend": "ast"}, {"encoding": "utf-8", "profile": True}, {"naming": {"setup": "s"}}]:
+            transpiler = ModuleTranspiler(**options)
+            self.assertEqual(transpiler.fingerprint_digest(), transpiler.codegen.fingerprint_digest())
+
+    def test_runtime(self):
+        import marshal
+        from htmlpp.bundle import HEADER, Bundler, load_bundle
+        from htmlpp.exceptions import InvalidBundle
+        payload = marshal.loads(Bundler(self.srcdir).compile()[len(HEADER):])
+        payload["runtime"] = -1
+        with self.assertRaisesRegex(InvalidBundle, "runtime=-1"):
+            load_bundle(HEADER + marshal.dumps(payload))
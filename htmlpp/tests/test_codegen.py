@@ -40,6 +40,92 @@ class CodegenTests(unittest.TestCase):
         result = render(context)
         self.assert_normalized(result, text)
 
+    def _parse(self, html):
+        from htmlpp import Lexer, Parser
+        return Parser()(Lexer()(html))
+
+    def test_coalescing_constant_writes(self):
+        html = '<p>foo</p><@def name="box"><div><@yield/></div></@def><p>bar</p>'
+        code = self._makeOne()(self._parse(html))
+        self.assertIn("_writer('<p>foo</p><p>bar</p>')", code)
+
+        render = self._callFUT(self._parse(html))
+        self.assertEqual(render({}), "<p>foo</p><p>bar</p>")
+
+    def test_attributes_are_constants(self):
+        from htmlpp.structure import Context
+        html = '<@def name="box"><div class="box"><@yield/></div></@def><@box class:add="x">a</@box><@box class:add="x">b</@box>'
+        code = self._makeOne()(self._parse(html))
+        self.assertNotIn("pickle.loads", code)
+        self.assertEqual(code.count("StaticAttributes([('class:add', '\"x\"')])"), 1)
+
+        render = self._callFUT(self._parse(html))
+        self.assertEqual(render(Context({}, None)), '<div class="box x">a</div><div class="box x">b</div>')
+
+    def test_hoisting_capture_free_blocks(self):
+        from htmlpp.structure import Context
+        html = '<@def name="box"><div><@yield/></div></@def><@box>a</@box><@box><@box>b</@box></@box>'
+        code = self._makeOne()(self._parse(html))
+        self.assertIn("def _block_body_0(_writer, _context):", code)
+        self.assertIn("def _block_body_1(_writer, _context):", code)
+        self.assertEqual(code.count("    def block_body(_writer, _context):"), 1)  # capturing _kwargs
+
+        render = self._callFUT(self._parse(html))
+        self.assertEqual(render(Context({}, None)), "<div>a</div><div><div>b</div></div>")
+
+    def test_coalescing_constant_writes__disabled(self):
+        html = '<p>foo</p><@def name="box"><div><@yield/></div></@def><p>bar</p>'
+        code = self._makeOne(optimize=0)(self._parse(html))
+        self.assertIn("_writer('<p>foo</p>')", code)
+        self.assertIn("_writer('<p>bar</p>')", code)
+
+    def test_inlining(self):
+        html = '<@def name="box"><div class="box"><@yield/></div></@def><@box id="x"><p>y</p></@box>'
+        code = self._makeOne(optimize=2)(self._parse(html))
+        self.assertIn("""_writer('<div class="box" id="x"><p>y</p></div>')""", code)
+        self.assertNotIn("new__kwargs", code.split("def render_(")[1])
+
+    def test_prerendering(self):
+        html = '<@def name="box"><div class="box"><@yield/></div></@def><@box id="x"><p>y</p></@box>'
+        code = self._makeOne(optimize=3)(self._parse(html))
+        M = {}
+        exec(code, M)
+        self.assertEqual(M["_HTMLPP_CONTENT"], '<div class="box" id="x"><p>y</p></div>')
+        self.assertEqual(M["render"](None), M["_HTMLPP_CONTENT"])
+        self.assertTrue(M["_HTMLPP_ETAG"].startswith('"'))
+
+    def test_prerendering__writer(self):
+        from io import StringIO
+        html = '<p>y</p>'
+        code = self._makeOne(optimize=3)(self._parse(html))
+        M = {}
+        exec(code, M)
+        port = StringIO()
+        self.assertIsNone(M["render"](None, port.write))
+        self.assertEqual(port.getvalue(), M["_HTMLPP_CONTENT"])
+
+    def test_profile(self):
+        from htmlpp.structure import Context
+        from htmlpp.profiling import Profiler
+        html = '<@def name="box"><div><@yield/></div></@def><@box>a</@box>'
+        self.assertNotIn("profiled", self._makeOne()(self._parse(html)))
+        code = self._makeOne(profile=True)(self._parse(html))
+        self.assertIn("@profiled(__name__, 'render_box')", code)
+        self.assertIn("@profiled(__name__, 'block_body@box')", code)
+
+        M = {"__name__": "m"}
+        exec(code, M)
+        context = Context({}, None)
+        context.profiler = Profiler()
+        self.assertEqual(M["render"](context), "<div>a</div>")
+        self.assertEqual([(key, stats.calls) for key, stats in context.profiler.aggregate(by=("name", "caller"))],
+                         [(("render_", None), 1), (("render_box", "m:render_"), 1), (("block_body@box", "m:render_box"), 1)])
+
+    def test_prerendering__with_pyimport(self):
+        html = '<@pyimport module="htmlpp.utils" alias="u"/><p>y</p>'
+        code = self._makeOne(optimize=3)(self._parse(html))
+        self.assertNotIn("_HTMLPP_CONTENT", code)
+
 
 def _normalize(html):
     lines = [x.strip() for x in html.strip().split("\n")]
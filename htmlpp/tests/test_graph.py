@@ -0,0 +1,49 @@
+# -*- coding:utf-8 -*-
+import unittest
+import evilunit
+
+
+@evilunit.test_target("htmlpp.graph:DependencyGraph")
+class DependencyGraphTests(unittest.TestCase):
+    def _makeGraph(self, edges):
+        target = self._makeOne()
+        for name, imports in edges.items():
+            target.add(name, imports)
+        return target
+
+    def test_dependents(self):
+        target = self._makeGraph({"main": ["lib.tags"], "lib.tags": ["lib.helpers"], "other": [], "lib.helpers": []})
+        self.assertEqual(target.dependents(["lib.helpers"]), {"lib.tags", "main"})
+        self.assertEqual(target.dependents(["main"]), set())
+
+    def test_find_cycle(self):
+        target = self._makeGraph({"main": ["a"], "a": ["b"], "b": ["a"]})
+        self.assertEqual(target.find_cycle("main"), ["a", "b", "a"])
+
+    def test_find_cycle__not_found(self):
+        target = self._makeGraph({"main": ["a", "b"], "a": ["b"], "b": []})
+        self.assertIsNone(target.find_cycle("main"))
+
+    def test_find_cycle__long_chain(self):
+        import sys
+        n = sys.getrecursionlimit() * 2
+        edges = {"m{}".format(i): ["m{}".format(i + 1)] for i in range(n)}
+        edges["m{}".format(n)] = ["m0"]
+        target = self._makeGraph(edges)
+        cycle = target.find_cycle("m0")
+        self.assertEqual((len(cycle), cycle[0], cycle[-1]), (n + 2, "m0", "m0"))
+        del edges["m{}".format(n)]
+        self.assertIsNone(self._makeGraph(edges).find_cycle("m0"))
+
+
+@evilunit.test_function("htmlpp.graph:collect_imports")
+class CollectImportsTests(unittest.TestCase):
+    def test_it(self):
+        from htmlpp import Lexer, Parser
+        html = """\
+<@import module="lib.tags" alias="t"/>
+<@pyimport module="htmlpp.utils" alias="u"/>
+<@def name="x"><@import module="lib.helpers"/></@def>
+"""
+        result = self._callFUT(Parser()(Lexer()(html)))
+        self.assertEqual(result, (("lib.tags", "lib.helpers"), ("htmlpp.utils", )))
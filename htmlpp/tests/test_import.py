@@ -1,7 +1,12 @@
 # -*- coding:utf-8 -*-
 import unittest
 import os
+import sys
+import json
+import shutil
+import tempfile
 import contextlib
+import evilunit
 
 
 here = os.path.abspath(os.path.dirname(__file__))
@@ -14,6 +19,19 @@ def assert_switch_off_to_on(self, fn):
     self.assertTrue(fn())
 
 
+class TemplateDirectoryMixin(object):
+    """srcdir (the templates written by _write()) and cachedir, removed after each test"""
+    def setUp(self):
+        self.srcdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.srcdir)
+        self.cachedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cachedir)
+
+    def _write(self, name, html):
+        with open(os.path.join(self.srcdir, name + ".pre.html"), "w") as wf:
+            wf.write(html)
+
+
 class GeneratingModuleTests(unittest.TestCase):
     def _makeOne(self, directories, outdir):
         from htmlpp.loader import get_repository
@@ -42,6 +60,86 @@ class GeneratingModuleTests(unittest.TestCase):
         pass
 
 
+class InMemoryCompilationTests(unittest.TestCase):
+    def _makeOne(self, directories, outdir):
+        from htmlpp.loader import get_repository
+        return get_repository(directories, outdir=outdir)
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def test_render__not_writing_file(self):
+        repository = self._makeOne([here], outdir=self.outdir)
+        result = repository.render('<@def name="a"><a><@yield/></a></@def><@a>x</@a>')
+        self.assertEqual(result.strip(), "<a>x</a>")
+        self.assertEqual(os.listdir(self.outdir), [])
+
+    def test_render__compiled_once(self):
+        repository = self._makeOne([here], outdir=self.outdir)
+        transpiler = repository.repository.transpiler
+        emitted = []
+        emit = transpiler.emit
+        transpiler.emit = lambda html: emitted.append(html) or emit(html)
+
+        html = '<@def name="a"><a><@yield/></a></@def><@a>x</@a>'
+        self.assertEqual(repository.render(html), repository.render(html))
+        self.assertEqual(len(emitted), 1)
+
+        repository.render(html + "<p>y</p>")
+        self.assertEqual(len(emitted), 2)
+
+
+class BytecodeCacheTests(TemplateDirectoryMixin, unittest.TestCase):
+    def _makeOne(self, directories, cachedir):
+        from htmlpp.loader import get_repository
+        return get_repository(directories, cachedir=cachedir)
+
+    def setUp(self):
+        super().setUp()
+        self._write("cached_box", '<@def name="box"><div class="box"><@yield/></div></@def>')
+
+    def _count_emit(self, repository):
+        transpiler = repository.repository.transpiler
+        emitted = []
+        emit = transpiler.emit
+        transpiler.emit = lambda html: emitted.append(html) or emit(html)
+        return emitted
+
+    def test_cold_start__not_transpiled(self):
+        self._makeOne([self.srcdir], self.cachedir)("cached_box")
+
+        repository = self._makeOne([self.srcdir], self.cachedir)
+        emitted = self._count_emit(repository)
+        module = repository("cached_box")
+        self.assertEqual(emitted, [])
+        self.assertTrue(hasattr(module, "render_box"))
+
+    def test_changed_source__transpiled(self):
+        self._makeOne([self.srcdir], self.cachedir)("cached_box")
+
+        self._write("cached_box", '<@def name="box"><p class="box"><@yield/></p></@def>')
+        repository = self._makeOne([self.srcdir], self.cachedir)
+        emitted = self._count_emit(repository)
+        result = repository.render('<@import module="cached_box"/><@cached_box:box>x</@cached_box:box>')
+        self.assertEqual(result.strip(), '<p class="box">x</p>')
+        self.assertEqual(len(emitted), 2)  # cached_box and the template string
+
+    def test_fresh_check_by_digest(self):
+        from htmlpp.loader import get_repository
+        outdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outdir)
+        get_repository([self.srcdir], outdir=outdir)("cached_box")
+
+        self._write("cached_box", '<@def name="box"><p class="box"><@yield/></p></@def>')
+        repository = get_repository([self.srcdir], outdir=outdir)
+        emitted = self._count_emit(repository)
+        repository("cached_box")
+        self.assertEqual(len(emitted), 1)
+
+
 class UsingExternalModuleTests(unittest.TestCase):
     def _makeOne(self, directories, outdir):
         from htmlpp.loader import get_repository
@@ -146,6 +244,67 @@ class UsingExternalModuleTests(unittest.TestCase):
         self.assertEqual(result.strip(), '<div class="hmm">hai</div>')
 
 
+class InliningImportedModuleTests(TemplateDirectoryMixin, unittest.TestCase):
+    def _makeOne(self, directories, cachedir):
+        from htmlpp.loader import get_repository
+        return get_repository(directories, cachedir=cachedir, optimize=2)
+
+    def setUp(self):
+        super().setUp()
+        self._write("inlined_alpha", '<@def name="one"><div class="one"><@yield/></div></@def>')
+        self._write("inlined_beta", """\
+<@import module="inlined_alpha" alias="a"/>
+<@def name="two"><@a:one class:add="two"><@yield/></@a:one></@def>
+""")
+
+    def test_it(self):
+        repository = self._makeOne([self.srcdir], self.cachedir)
+        html = '<@import module="inlined_beta" alias="b"/><@b:two>hmm</@b:two>'
+        module = repository.from_string(html, outdir=None)
+        self.assertEqual(module.getvalue(), '<div class="one two">hmm</div>')
+        self.assertEqual(sorted(module._HTMLPP_INLINED.keys()), ["inlined_alpha", "inlined_beta"])
+
+    def test_modified_dependency__recompiled(self):
+        html = '<@import module="inlined_beta" alias="b"/><@b:two>hmm</@b:two>'
+        self._makeOne([self.srcdir], self.cachedir).render(html)
+
+        self._write("inlined_alpha", '<@def name="one"><p class="one"><@yield/></p></@def>')
+        result = self._makeOne([self.srcdir], self.cachedir).render(html)
+        self.assertEqual(result, '<p class="one two">hmm</p>')
+
+    def test_modified_dependency__in_memory_code_cache(self):
+        from htmlpp.loader import get_repository
+        repository = get_repository([self.srcdir], optimize=2)
+        html = '<@import module="inlined_beta" alias="b"/><@b:two>hmm</@b:two>'
+        self.assertEqual(repository.render(html), '<div class="one two">hmm</div>')
+
+        self._write("inlined_alpha", '<@def name="one"><p class="one"><@yield/></p></@def>')
+        repository.refresh()
+        self.assertEqual(repository.render(html), '<p class="one two">hmm</p>')
+
+    def test_code_cache_hit__dependencies_are_not_checked(self):
+        from htmlpp.loader import get_repository
+        repository = get_repository([self.srcdir], optimize=2)
+        html = '<@import module="inlined_beta" alias="b"/><@b:two>hmm</@b:two>'
+        repository.render(html)
+
+        transpiler = repository.repository.transpiler
+        located = []
+        locate = transpiler.locate
+        transpiler.locate = lambda name: located.append(name) or locate(name)
+        transpiler.compile(html, "_htmlpp_cached")
+        self.assertEqual(located, [])
+        self.assertEqual(repository.stats()["code_cache_hits"], 1)
+
+    def test_prerendering(self):
+        from htmlpp.loader import get_repository
+        repository = get_repository([self.srcdir], cachedir=self.cachedir, optimize=3)
+        html = '<@import module="inlined_beta" alias="b"/><@b:two>hmm</@b:two>'
+        module = repository.from_string(html, outdir=None)
+        self.assertEqual(module._HTMLPP_CONTENT, '<div class="one two">hmm</div>')
+        self.assertEqual(module.getvalue(), module._HTMLPP_CONTENT)
+
+
 class UsingExternalPythonModuleTests(unittest.TestCase):
     def _makeOne(self, directories, outdir=None):
         from htmlpp.loader import get_repository
@@ -168,3 +327,569 @@ class UsingExternalPythonModuleTests(unittest.TestCase):
 """
         result = repository.render(html)
         self.assertEqual(result.strip(), 'hello')
+
+
+async def render_greeting(_writer, _context, _kwargs, _default_attributes={}):
+    # used by AsynchronousRenderingTests (a coroutine function imported by @pyimport)
+    _writer("hello")
+
+
+def render_class_attribute(_writer, _context, _kwargs, _default_attributes={}):
+    # used by CustomNamingTests (reading the attributes of the call site, by naming["attributes"])
+    _writer(_kwargs.get("attrs", {}).get("class", "-"))
+
+
+class CustomNamingTests(unittest.TestCase):
+    def _makeOne(self, **kwargs):
+        from htmlpp.loader import get_repository
+        naming = dict(
+            setup="setup", render_fmt="render_{}", block_fmt="block_{}", writer="_writer", context="_context",
+            kwargs="_kwargs", attributes="attrs", default_attributes="_default_attributes",
+        )
+        return get_repository(["."], outdir=None, naming=naming, **kwargs)
+
+    def test_attributes_of_pyimport_helper(self):
+        html = """\
+<@pyimport module="htmlpp.tests.test_import" alias="t"/>
+<@t:class_attribute class="x"/>
+"""
+        for backend in ("source", "ast"):
+            repository = self._makeOne(backend=backend)
+            self.assertEqual(repository.render(html).strip(), '"x"')
+
+
+class RenderIterTests(unittest.TestCase):
+    html = """\
+<@def name="item"><li><@yield/></li></@def>
+<ul><@item>a</@item><@item>b</@item><@item>c</@item></ul>
+"""
+
+    def _makeOne(self, **kwargs):
+        from htmlpp.loader import get_repository
+        return get_repository(["."], outdir=None, **kwargs)
+
+    def test_chunks(self):
+        repository = self._makeOne()
+        chunks = list(repository.render_iter(self.html, chunk_size=4))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual("".join(chunks), repository.render(self.html))
+
+    def test_streaming(self):
+        repository = self._makeOne(streaming=True)
+        chunks = repository.render_iter(self.html, chunk_size=4)
+        # yielded before the rest of the page is rendered
+        self.assertEqual(next(chunks).strip(), "<ul>")
+        self.assertEqual("".join(chunks).strip(), "<li>a</li><li>b</li><li>c</li></ul>")
+
+    def test_prerendering(self):
+        for streaming in (False, True):
+            repository = self._makeOne(optimize=3, streaming=streaming)
+            module = repository.from_string(self.html, outdir=None)
+            self.assertTrue(hasattr(module, "_HTMLPP_CONTENT"))
+            chunks = list(repository.render_iter(self.html, chunk_size=4))
+            self.assertTrue(all(len(chunk) <= 4 for chunk in chunks))
+            self.assertEqual("".join(chunks), module._HTMLPP_CONTENT)
+
+    def test_streaming_with_pyimport(self):
+        repository = self._makeOne(streaming=True)
+        html = """\
+<@pyimport module="htmlpp.utils" alias="u"/>
+<@u:hello/>
+"""
+        self.assertEqual("".join(repository.render_iter(html)).strip(), "hello")
+        self.assertEqual(repository.render(html).strip(), "hello")
+
+
+class AsynchronousRenderingTests(unittest.TestCase):
+    def _makeOne(self):
+        from htmlpp.loader import get_repository
+        return get_repository(["."], outdir=None, asynchronous=True)
+
+    def test_sink(self):
+        import asyncio
+        repository = self._makeOne()
+        html = '<@def name="item"><li><@yield/></li></@def><ul>' + "<@item>x</@item>" * 10 + "</ul>"
+        module = repository.from_string(html, outdir=None)
+        chunks = []
+
+        async def send(chunk):
+            chunks.append(chunk)
+
+        result = asyncio.run(module.render(module.context, send, chunk_size=16))
+        self.assertIsNone(result)
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual("".join(chunks).strip(), "<ul>" + "<li>x</li>" * 10 + "</ul>")
+
+    def test_render_iter(self):
+        import asyncio
+        from htmlpp.loader import get_repository
+        html = '<@def name="item"><li><@yield/></li></@def><ul>' + "<@item>x</@item>" * 10 + "</ul>"
+
+        async def collect(repository):
+            return [chunk async for chunk in repository.render_iter(html, chunk_size=16)]
+
+        for optimize in (1, 3):
+            repository = get_repository(["."], outdir=None, asynchronous=True, optimize=optimize)
+            chunks = asyncio.run(collect(repository))
+            self.assertTrue(len(chunks) > 1)
+            self.assertEqual("".join(chunks).strip(), "<ul>" + "<li>x</li>" * 10 + "</ul>")
+
+    def test_render_iter__error(self):
+        import asyncio
+        from htmlpp.exceptions import CodegenException
+        repository = self._makeOne()
+
+        async def collect():
+            return [chunk async for chunk in repository.render_iter("<p>hmm</p><@missing/>")]
+
+        with self.assertRaises(CodegenException):
+            asyncio.run(collect())
+
+    def test_coroutine_helper(self):
+        import asyncio
+        repository = self._makeOne()
+        html = """\
+<@pyimport module="htmlpp.tests.test_import" alias="t"/>
+<@pyimport module="htmlpp.utils" alias="u"/>
+<@t:greeting/>, <@u:hello/>
+"""
+        result = asyncio.run(repository.render(html))
+        self.assertEqual(result.strip(), "hello, hello")
+
+
+class EncodingTests(unittest.TestCase):
+    html = """\
+<@pyimport module="htmlpp.utils" alias="u"/>
+<@def name="item"><li class="item"><@yield/></li></@def>
+<ul><@item class:add="first">ä</@item><@item>あ</@item><li><@u:hello/></li></ul>
+"""
+
+    def _makeOne(self, **kwargs):
+        from htmlpp.loader import get_repository
+        return get_repository(["."], outdir=None, encoding="utf-8", **kwargs)
+
+    def test_bytearray(self):
+        repository = self._makeOne()
+        result = repository.render(self.html)
+        self.assertIsInstance(result, bytearray)
+        self.assertEqual(result.strip().decode("utf-8"), '<ul><li class="item first">ä</li><li class="item">あ</li><li>hello</li></ul>')
+
+    def test_binary_writer(self):
+        import io
+        repository = self._makeOne()
+        module = repository.from_string(self.html, outdir=None)
+        port = io.BytesIO()
+        wf = io.BufferedWriter(port)
+        module.render(module.context, wf.write)
+        wf.flush()
+        self.assertEqual(bytes(port.getvalue()), bytes(module.getvalue()))
+
+    def test_prerendering(self):
+        repository = self._makeOne(optimize=3)
+        module = repository.from_string("<p>ä</p>", outdir=None)
+        self.assertEqual(module._HTMLPP_CONTENT, "<p>ä</p>".encode("utf-8"))
+        self.assertIs(module.getvalue(), module._HTMLPP_CONTENT)  # not copied
+        self.assertEqual(b"".join(module.render_iter(module.context)), module._HTMLPP_CONTENT)
+
+
+class DependencyGraphTests(TemplateDirectoryMixin, unittest.TestCase):
+    def _makeOne(self, directories):
+        from htmlpp.loader import get_repository
+        return get_repository(directories, outdir=None)
+
+    def setUp(self):
+        super().setUp()
+        self._write("graph_helpers", '<@def name="em"><em><@yield/></em></@def>')
+        self._write("graph_tags", '<@import module="graph_helpers" alias="h"/><@def name="box"><div><@h:em><@yield/></@h:em></div></@def>')
+        self._write("graph_main", '<@import module="graph_tags" alias="t"/><@t:box>hmm</@t:box>')
+        self._write("graph_other", '<p>other</p>')
+
+    def _render(self, repository, module_name):
+        return repository(module_name).render(repository.create_context())
+
+    def test_graph(self):
+        repository = self._makeOne([self.srcdir])
+        self._render(repository, "graph_main")
+        self.assertEqual(repository.graph.imports["graph_main"], ("graph_tags", ))
+        self.assertEqual(repository.graph.dependents(["graph_helpers"]), {"graph_tags", "graph_main"})
+
+    def test_refresh__dependents_are_recompiled(self):
+        repository = self._makeOne([self.srcdir])
+        self._render(repository, "graph_main")
+        self._render(repository, "graph_other")
+        self.assertEqual(repository.refresh(), [])
+
+        self._write("graph_helpers", '<@def name="em"><strong><@yield/></strong></@def>')
+        self.assertEqual(repository.refresh(), ["graph_helpers", "graph_main", "graph_tags"])
+        self.assertEqual(self._render(repository, "graph_main"), "<div><strong>hmm</strong></div>")
+
+    def test_cyclic_import(self):
+        from htmlpp.exceptions import CyclicImport
+        self._write("graph_helpers", '<@import module="graph_main" alias="m"/><@def name="em"><em><@yield/></em></@def>')
+        repository = self._makeOne([self.srcdir])
+        with self.assertRaisesRegex(CyclicImport, "graph_helpers -> graph_main -> graph_tags -> graph_helpers"):
+            self._render(repository, "graph_main")
+        self.assertNotIn("graph_helpers", repository)
+
+    def test_cycle_check__sources_are_not_parsed_again(self):
+        import types
+        repository = self._makeOne([self.srcdir]).repository
+        repository.transpiler.parser = lambda tokens: self.fail("parsed")
+        module = types.ModuleType("graph_main")
+        module._HTMLPP_IMPORTS = ("graph_tags", )
+        repository["graph_main"] = module  # graph_tags is not loaded yet
+        self.assertEqual(repository.graph.imports, {"graph_main": ("graph_tags", )})
+
+
+@evilunit.test_target("htmlpp.loader:ModuleIndex")
+class ModuleIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.dirs = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        self._write(self.dirs[0], "a/b.pre.html")
+        self._write(self.dirs[1], "a/b.pre.html")
+        self._write(self.dirs[1], "c.pre.html")
+
+    def tearDown(self):
+        for d in self.dirs:
+            shutil.rmtree(d)
+
+    def _write(self, d, path_name):
+        path = os.path.join(d, path_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "w").close()
+
+    def test_it(self):
+        target = self._makeOne(self.dirs)
+        self.assertEqual(target.get("a/b.pre.html"), os.path.join(self.dirs[0], "a/b.pre.html"))
+        self.assertEqual(target.get("c.pre.html"), os.path.join(self.dirs[1], "c.pre.html"))
+        self.assertIsNone(target.get("d.pre.html"))
+
+    def test_refresh(self):
+        target = self._makeOne(self.dirs)
+        self.assertIsNone(target.get("d.pre.html"))
+        self._write(self.dirs[0], "d.pre.html")
+        self.assertIsNone(target.get("d.pre.html"))  # cached negative entry
+        target.refresh()
+        self.assertEqual(target.get("d.pre.html"), os.path.join(self.dirs[0], "d.pre.html"))
+
+    def test_refresh__symlink_loop(self):
+        os.symlink(self.dirs[0], os.path.join(self.dirs[0], "a", "loop"))
+        target = self._makeOne(self.dirs)
+        self.assertEqual(target.get("a/b.pre.html"), os.path.join(self.dirs[0], "a/b.pre.html"))
+        self.assertIsNone(target.get("a/loop/a/b.pre.html"))  # not walked again
+
+    def test_ttl(self):
+        target = self._makeOne(self.dirs, ttl=0)
+        self.assertIsNone(target.get("d.pre.html"))
+        self._write(self.dirs[0], "d.pre.html")
+        self.assertIsNotNone(target.get("d.pre.html"))
+
+    def test_repository(self):
+        from htmlpp.loader import get_repository
+        from htmlpp.exceptions import NotFound
+        with open(os.path.join(self.dirs[1], "c.pre.html"), "w") as wf:
+            wf.write("<p>c</p>")
+        repository = get_repository(self.dirs, outdir=None, use_index=True)
+        module = repository("c")
+        self.assertEqual(module.render(repository.create_context()), "<p>c</p>")
+        with self.assertRaises(NotFound):
+            repository("d")
+
+
+class CheckIntervalTests(TemplateDirectoryMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self._write("interval_main", "<p>one</p>")
+
+    def _makeOne(self, check_interval):
+        from htmlpp.loader import get_repository
+        return get_repository([self.srcdir], cachedir=self.cachedir, check_interval=check_interval)
+
+    def _render(self, repository):
+        return repository("interval_main").render(repository.create_context())
+
+    def test_checked(self):
+        repository = self._makeOne(0)
+        self.assertEqual(self._render(repository), "<p>one</p>")
+        self._write("interval_main", "<p>two</p>")
+        self.assertEqual(self._render(repository), "<p>two</p>")
+
+    def test_not_checked_until_interval(self):
+        repository = self._makeOne(3600)
+        self.assertEqual(self._render(repository), "<p>one</p>")
+        self._write("interval_main", "<p>two</p>")
+        self.assertEqual(self._render(repository), "<p>one</p>")
+
+    def test_checked__imported_by_string(self):
+        self._write("interval_main", '<@def name="p"><p>one</p></@def>')
+        repository = self._makeOne(0)
+        html = '<@import module="interval_main" alias="m"/><@m:p/>'
+        self.assertEqual(repository.render(html), "<p>one</p>")
+        self._write("interval_main", '<@def name="p"><p>two</p></@def>')
+        self.assertEqual(repository.render(html), "<p>two</p>")
+        self.assertEqual("".join(repository.render_iter(html)), "<p>two</p>")
+
+
+class SetupOnceTests(unittest.TestCase):
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def _makeOne(self):
+        from htmlpp.loader import get_repository
+        return get_repository([os.path.join(here, "data")], cachedir=self.cachedir)
+
+    def test_setup_is_run_once_per_context(self):
+        repository = self._makeOne()
+        html = '<@import module="box" alias="b"/><@b:box>hmm</@b:box>'
+        module = repository.from_string(html)
+        imported = []
+
+        def import_module(context):
+            original = context.import_module
+            context.import_module = lambda *args: imported.append(args) or original(*args)
+
+        import_module(module.context)
+        self.assertEqual(module.getvalue(), module.getvalue())
+        self.assertEqual(repository.from_string(html).getvalue(), module.getvalue())
+        self.assertEqual(imported, [("box", "b")])  # linked at the first render
+
+        context = repository.create_context()
+        import_module(context)
+        module.render(context)
+        module.render(context)
+        self.assertEqual(imported, [("box", "b"), ("box", "b")])
+
+    def test_failed_setup_is_retried(self):
+        repository = self._makeOne()
+        html = '<@import module="box" alias="b"/><@b:box>hmm</@b:box>'
+        module = repository.from_string(html)
+        original = module.context.import_module
+        failures = [ImportError("box")]
+
+        def import_module(*args):
+            if failures:
+                raise failures.pop()
+            return original(*args)
+        module.context.import_module = import_module
+
+        with self.assertRaises(ImportError):
+            module.getvalue()
+        self.assertEqual(module.getvalue(), repository.render(html + " "))
+
+    def test_concurrent_renders__waiting_for_setup(self):
+        import time
+        import threading
+        repository = self._makeOne()
+        html = '<@import module="box" alias="b"/><@b:box>hmm</@b:box>'
+        module = repository.from_string(html)
+        original = module.context.import_module
+        module.context.import_module = lambda *args: time.sleep(0.05) or original(*args)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(module.getvalue())) for _ in range(4)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        self.assertEqual(results, [repository.render(html + " ")] * 4)
+
+    def test_from_string__module_is_reused(self):
+        repository = self._makeOne()
+        html = "<p>hmm</p>"
+        self.assertIs(repository.from_string(html), repository.from_string(html))
+        self.assertIsNot(repository.from_string(html), repository.from_string(html, context=repository.create_context()))
+
+
+class ProfilingTests(unittest.TestCase):
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def _makeOne(self, **kwargs):
+        from htmlpp.loader import get_repository
+        return get_repository([os.path.join(here, "data")], cachedir=self.cachedir, **kwargs)
+
+    def test_stats(self):
+        repository = self._makeOne(profile=True)
+        html = '<@import module="box" alias="b"/><@def name="two"><@b:box>x</@b:box><@b:box>y</@b:box></@def><@two/>'
+        module = repository.from_string(html)
+        module.getvalue()
+        module.getvalue()
+
+        stats = dict(((name, caller), s) for (_, name, caller), s in repository.profile_stats(by=("module", "name", "caller")))
+        caller = "{}:render_two".format(module.__name__)
+        self.assertEqual(stats[("render_two", "{}:render_".format(module.__name__))].calls, 2)
+        self.assertEqual(stats[("render_box", caller)].calls, 4)
+        self.assertEqual(stats[("render_box", caller)].written, len(module.getvalue()) * 2)
+
+        top = stats[("render_", None)]
+        self.assertGreaterEqual(top.inclusive, top.exclusive)
+        self.assertEqual([key for key, _ in repository.profile_stats(by=("name", ))][0], ("render_", ))
+
+    def test_disabled(self):
+        repository = self._makeOne()
+        self.assertIsNone(repository.create_context().profiler)
+        with self.assertRaises(ValueError):
+            repository.profile_stats()
+
+
+class TracingTests(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def _makeOne(self, observer, **kwargs):
+        from htmlpp.loader import get_repository
+        return get_repository([os.path.join(here, "data")], observer=observer, **kwargs)
+
+    def test_stages(self):
+        reported = []
+        repository = self._makeOne(lambda *args: reported.append(args), outdir=self.outdir)
+        module_name = "box"
+        sys.modules.pop(module_name, None)
+        self.addCleanup(sys.modules.pop, module_name, None)
+        repository(module_name)
+        self.assertEqual([(m, stage) for m, stage, _, _ in reported],
+                         [(module_name, stage) for stage in ("lex", "parse", "codegen", "write", "load")])
+        info = {stage: info for _, stage, _, info in reported}
+        self.assertGreater(info["lex"]["tokens"], 0)
+        self.assertGreater(info["parse"]["nodes"], 0)
+        self.assertGreater(info["codegen"]["source_size"], 0)
+        self.assertTrue(all(seconds >= 0 for _, _, seconds, _ in reported))
+
+    def test_summary(self):
+        from htmlpp.tracing import TraceSummary
+        summary = TraceSummary()
+        cachedir = os.path.join(self.outdir, "cache")
+        self._makeOne(summary, cachedir=cachedir).render("<p>hmm</p>")
+        self._makeOne(summary, cachedir=cachedir).render("<p>hmm</p>")  # bytecode cache is used
+
+        result = summary.summary()
+        self.assertEqual(result["stages"]["compile"]["count"], 2)
+        self.assertEqual(result["stages"]["lex"]["count"], 1)
+        self.assertEqual(result["stages"]["load"]["count"], 2)
+        self.assertEqual([module_id for module_id, _ in summary.slowest()], ["_htmlpp_internal0"])
+
+        path = os.path.join(self.outdir, "trace.json")
+        summary.dump(path)
+        with open(path) as rf:
+            self.assertEqual(json.load(rf)["stages"]["lex"]["count"], 1)
+
+
+class StatsTests(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def _makeOne(self, **kwargs):
+        from htmlpp.loader import get_repository
+        return get_repository([os.path.join(here, "data")], outdir=self.outdir, **kwargs)
+
+    def test_it(self):
+        module_name = "box"
+        sys.modules.pop(module_name, None)
+        self.addCleanup(sys.modules.pop, module_name, None)
+        repository = self._makeOne()
+        repository(module_name)
+        repository(module_name)
+        repository.render("<p>hmm</p>")
+        repository.render("<p>hmm</p>")
+
+        stats = repository.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["imports"]), (1, 1, 0))
+        self.assertEqual((stats["compiles"], stats["recompiles"]), (2, 0))
+        self.assertEqual((stats["code_cache_hits"], stats["code_cache_misses"]), (0, 1))
+        self.assertEqual(stats["modules"], 1)
+        self.assertEqual(stats["string_modules"], 1)
+        self.assertEqual(stats["stat_calls"], 1)
+        self.assertGreater(stats["memory"][module_name], 0)
+        self.assertEqual(stats["memory_total"], stats["memory"][module_name])
+
+    def test_compiles__cache_hits_are_not_counted(self):
+        repository = self._makeOne()
+        for _ in range(3):
+            repository.from_string("<p>hmm</p>", outdir=None, context=repository.create_context())
+        stats = repository.stats()
+        self.assertEqual((stats["compiles"], stats["code_cache_hits"]), (1, 2))
+
+    def test_stale_module_is_recompiled(self):
+        module_name = "box"
+        sys.modules.pop(module_name, None)
+        self.addCleanup(sys.modules.pop, module_name, None)
+        self._makeOne(optimize=0)(module_name)
+        sys.modules.pop(module_name, None)
+
+        repository = self._makeOne()  # the fingerprint is changed
+        repository(module_name)
+        stats = repository.stats()
+        self.assertEqual((stats["imports"], stats["recompiles"], stats["compiles"]), (0, 1, 1))
+
+    def test_index(self):
+        repository = self._makeOne(use_index=True)
+        repository.render('<@import module="box"/><@box:box>x</@box:box>')
+        stats = repository.stats()
+        self.assertEqual((stats["stat_calls"], stats["index_scans"]), (0, 1))
+
+
+class AstBackendTests(unittest.TestCase):
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def _makeOne(self, **kwargs):
+        from htmlpp.loader import get_repository
+        return get_repository([os.path.join(here, "data")], cachedir=self.cachedir, backend="ast", **kwargs)
+
+    def test_it(self):
+        from htmlpp.astgen import AstCodegen
+        repository = self._makeOne()
+        self.assertIsInstance(repository.repository.transpiler.codegen, AstCodegen)
+        html = """\
+<@import module="box" alias="b"/>
+<@pyimport module="htmlpp.utils" alias="u"/>
+<@b:box class:add="x"><@u:hello/></@b:box>
+"""
+        result = "".join(line.strip() for line in repository.render(html).splitlines())
+        self.assertEqual(result, '<div class="box x">hello</div>')
+
+    def test_emit(self):
+        repository = self._makeOne()
+        code = repository.repository.transpiler.emit('<@def name="box"><div><@yield/></div></@def><@box>a</@box>')
+        self.assertIn("def render_box(_writer, _context, _kwargs, _default_attributes=StaticAttributes([])):", code)
+        M = {}
+        exec(code, M)
+        self.assertEqual(M["render"]({}), "<div>a</div>")
+
+    def test_fallback(self):
+        repository = self._makeOne(streaming=True)
+        self.assertEqual("".join(repository.render_iter("<p>hmm</p>")), "<p>hmm</p>")
+
+    def test_outdir__compiled_in_memory(self):
+        from htmlpp.loader import get_repository
+        outdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outdir)
+        with self.assertLogs("htmlpp.loader", level="WARNING") as logs:
+            repository = get_repository([os.path.join(here, "data")], outdir=outdir, backend="ast")
+        self.assertIn("is not used", logs.output[0])
+        module = repository("box")
+        self.assertTrue(hasattr(module, "render_box"))
+        self.assertEqual(os.listdir(outdir), [])
+
+    def test_functions_have_distinct_lines(self):
+        repository = self._makeOne(profile=True)
+        html = '<@def name="a"><a><@yield/></a></@def><@def name="b"><b><@yield/></b></@def><@a><@b>x</@b></@a>'
+        module = repository.from_string(html)
+        functions = [module.render_, module.render_a, module.render_b, module.setup, module.render, module.render_iter]
+        lines = [fn.__wrapped__.__code__.co_firstlineno if hasattr(fn, "__wrapped__") else fn.__code__.co_firstlineno for fn in functions]
+        self.assertEqual(len(set(lines)), len(lines))
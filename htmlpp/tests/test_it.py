@@ -316,3 +316,77 @@ Y
 def _normalize(html):
     lines = [x.strip() for x in html.strip().split("\n")]
     return "".join(lines).replace("</", "\n</")
+
+
+class InliningTests(Tests):
+    def _callFUT(self, input_html):
+        from htmlpp import Lexer, Parser, Codegen
+        lexer = Lexer()
+        parser = Parser()
+        codegen = Codegen(optimize=2)
+        M = {}
+        code = codegen(parser(lexer(input_html)))
+        exec(code, M)
+        return M["render"]
+
+
+class StreamingTests(Tests):
+    def _callFUT(self, input_html):
+        from htmlpp import Lexer, Parser, Codegen
+        lexer = Lexer()
+        parser = Parser()
+        codegen = Codegen(streaming=True)
+        M = {}
+        code = codegen(parser(lexer(input_html)))
+        exec(code, M)
+        return M["render"]
+
+
+class AsynchronousTests(Tests):
+    def _callFUT(self, input_html):
+        import asyncio
+        from htmlpp import Lexer, Parser, Codegen
+        lexer = Lexer()
+        parser = Parser()
+        codegen = Codegen(asynchronous=True)
+        M = {}
+        code = codegen(parser(lexer(input_html)))
+        exec(code, M)
+        return lambda context: asyncio.run(M["render"](context))
+
+
+class EncodingTests(Tests):
+    def _callFUT(self, input_html):
+        from htmlpp import Lexer, Parser, Codegen
+        lexer = Lexer()
+        parser = Parser()
+        codegen = Codegen(encoding="utf-8")
+        M = {}
+        code = codegen(parser(lexer(input_html)))
+        exec(code, M)
+        return lambda context: M["render"](context).decode("utf-8")
+
+
+class AstBackendTests(Tests):
+    optimize = 1
+    encoding = None
+
+    def _callFUT(self, input_html):
+        from htmlpp import Lexer, Parser
+        from htmlpp.astgen import AstCodegen
+        lexer = Lexer()
+        parser = Parser()
+        codegen = AstCodegen(optimize=self.optimize, encoding=self.encoding)
+        M = {}
+        exec(compile(codegen.build(parser(lexer(input_html))), "<htmlpp>", "exec"), M)
+        if self.encoding is not None:
+            return lambda context: M["render"](context).decode(self.encoding)
+        return M["render"]
+
+
+class AstBackendWithoutOptimizationTests(AstBackendTests):
+    optimize = 0
+
+
+class AstBackendEncodingTests(AstBackendTests):
+    encoding = "utf-8"
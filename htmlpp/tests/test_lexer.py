@@ -72,3 +72,16 @@ class LexerTests(unittest.TestCase):
 
         self.assertIsInstance(openclose_tag, OpenClose)
         self.assertEqual(openclose_tag.name, "yield")
+
+    def test_position(self):
+        s = """
+<p><@box>
+  text </@box>
+  <@yield/></p>
+"""
+        target = self._makeOne()
+        result = target(s)
+        tokens = [x for x in result if not isinstance(x, str)]
+        self.assertEqual([(t.line, t.column) for t in tokens], [(2, 4), (3, 8), (4, 3)])
+        self.assertEqual(result[0], "<p>")
+        self.assertEqual(result[-1], "</p>")
@@ -76,3 +76,12 @@ class ParserTests(unittest.TestCase):
         self.assertEqual(len(ast.children), 2)
         self.assertEqual(len(ast.children[0].children), 3)
         self.assertEqual(len(ast.children[0].children[1].children), 3)
+
+    def test_unmatched__position_in_message(self):
+        from htmlpp.lexer import Lexer
+        from htmlpp.exceptions import ParseException
+        target = self._makeOne()
+        with self.assertRaisesRegex(ParseException, "line 2, column 3"):
+            target(Lexer()("<p>\n  <@box>hmm</p>"))
+        with self.assertRaisesRegex(ParseException, "line 1, column 7"):
+            target(Lexer()("<p>hmm</@box></p>"))
@@ -0,0 +1,62 @@
+# -*- coding:utf-8 -*-
+import unittest
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+
+# not imported, by the processes only rendering precompiled modules
+COMPILER_MODULES = [
+    "htmlpp.lexer", "htmlpp.parser", "htmlpp.codegen",
+    "prestring", "pickle", "shlex", "asyncio", "tempfile", "concurrent.futures",
+]
+
+
+def imported_in_subprocess(code):
+    code = "{}\nimport sys, json\nprint(json.dumps([name for name in {!r} if name in sys.modules]))".format(code, COMPILER_MODULES)
+    output = subprocess.check_output([sys.executable, "-c", code])
+    return json.loads(output.decode("utf-8").splitlines()[-1])
+
+
+class LazyImportTests(unittest.TestCase):
+    def test_import_htmlpp(self):
+        self.assertEqual(imported_in_subprocess("import htmlpp, htmlpp.runtime"), [])
+
+    def test_lazy_attributes(self):
+        imported = imported_in_subprocess("import htmlpp; htmlpp.Codegen")
+        self.assertIn("htmlpp.codegen", imported)
+        self.assertIn("prestring", imported)
+
+
+class PrecompiledRenderingTests(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.srcdir = os.path.join(self.workdir, "src")
+        os.makedirs(self.srcdir)
+        with open(os.path.join(self.srcdir, "htmlpp_precompiled.pre.html"), "w") as wf:
+            wf.write('<@def name="box"><div class="box"><@yield/></div></@def><@box>hmm</@box>')
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def _render_code(self, **kwargs):
+        return "\n".join([
+            "from htmlpp.loader import get_repository",
+            "repository = get_repository([], {})".format(", ".join("{}={!r}".format(k, v) for k, v in kwargs.items())),
+            "module = repository('htmlpp_precompiled')",
+            "assert module.render(repository.create_context()) == '<div class=\"box\">hmm</div>'",
+        ])
+
+    def test_bundle(self):
+        from htmlpp.bundle import bundle
+        path = os.path.join(self.workdir, "templates.htmlppz")
+        bundle(self.srcdir, path)
+        self.assertEqual(imported_in_subprocess(self._render_code(bundle=path)), [])
+
+    def test_frozen(self):
+        from htmlpp.build import build
+        outdir = os.path.join(self.workdir, "out")
+        build(self.srcdir, outdir, jobs=1)
+        self.assertEqual(imported_in_subprocess(self._render_code(outdir=outdir, frozen=True)), [])
@@ -0,0 +1,39 @@
+# -*- coding:utf-8 -*-
+import unittest
+import evilunit
+
+
+@evilunit.test_target("htmlpp.structure:Frame")
+class FrameTests(unittest.TestCase):
+    def test_child__blocks_are_flattened(self):
+        parent = self._makeOne().child({"block_body": "a", "block_title": "t"})
+        child = parent.child({"block_body": "b"})
+        self.assertEqual(child.blocks, {"block_body": "b", "block_title": "t"})
+        self.assertEqual(parent.blocks["block_body"], "a")
+
+    def test_child__without_blocks(self):
+        parent = self._makeOne().child({"block_body": "a"})
+        self.assertIs(parent.child().blocks, parent.blocks)
+
+    def test_child__attributes_are_inherited(self):
+        parent = self._makeOne().child({}, {"class": "x"})
+        self.assertEqual(parent.child({}).attributes, {"class": "x"})
+        self.assertEqual(parent.child({}, {"id": "y"}).attributes, {"id": "y"})
+
+    def test_not_registered(self):
+        from htmlpp.exceptions import CodegenException
+        target = self._makeOne()
+        with self.assertRaisesRegex(CodegenException, "block_body is not registered"):
+            target.blocks["block_body"]
+
+    def test_mapping_interface(self):
+        target = self._makeOne().child({"block_body": "a"}, {"class": "x"})
+        self.assertEqual(target["block_body"], "a")
+        self.assertEqual(target.get("_attributes"), {"class": "x"})
+        self.assertNotIn("block_title", target)
+
+    def test_mapping_interface__custom_name(self):
+        target = self._makeOne(name="attrs").child({"block_body": "a"}, {"class": "x"})
+        self.assertEqual(target["attrs"], {"class": "x"})
+        self.assertNotIn("_attributes", target)
+        self.assertEqual(target.child({}, name="other").get("other"), {"class": "x"})
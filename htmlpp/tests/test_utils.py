@@ -45,6 +45,21 @@ class ParseAttrsTests(unittest.TestCase):
         ])
         self.assertEqual(result, expected)
 
+    def test_equal_in_quoted(self):
+        attr_string = """href="/?q=1&page=2" x=y"""
+        result = self._callFUT(attr_string)
+        expected = OrderedDict([('href', '"/?q=1&page=2"'), ('x', 'y')])
+        self.assertEqual(result, expected)
+
+    def test_unclosed_quote(self):
+        with self.assertRaises(ValueError):
+            self._callFUT(""" class="foo """)
+
+    def test_result_is_not_shared(self):
+        attr_string = """ class="foo" """
+        self._callFUT(attr_string)["class"] = '"bar"'
+        self.assertEqual(self._callFUT(attr_string), OrderedDict([('class', '"foo"')]))
+
 
 @evilunit.test_function("htmlpp.utils:string_from_attrs")
 class StringFromAttrsTest(unittest.TestCase):
@@ -126,3 +141,62 @@ class MergeDictTest(unittest.TestCase):
         d1 = {"a:del": "b"}
         self._callFUT(d0, d1)
         self.assertEqual(d0, {"a": " c"})
+
+
+@evilunit.test_target("htmlpp.utils:LRUCache")
+class LRUCacheTests(unittest.TestCase):
+    def test_it__bounded(self):
+        target = self._makeOne(maxsize=2)
+        target["a"] = 1
+        target["b"] = 2
+        target["c"] = 3
+        self.assertEqual(len(target), 2)
+        self.assertNotIn("a", target)
+
+    def test_it__recently_used_is_kept(self):
+        target = self._makeOne(maxsize=2)
+        target["a"] = 1
+        target["b"] = 2
+        self.assertEqual(target.get("a"), 1)
+        target["c"] = 3
+        self.assertIn("a", target)
+        self.assertNotIn("b", target)
+
+
+@evilunit.test_target("htmlpp.utils:StaticAttributes")
+class StaticAttributesTests(unittest.TestCase):
+    def test_render(self):
+        target = self._makeOne([("class", '"box"'), ("id", '"x"')])
+        self.assertEqual(target.render(), ' class="box" id="x"')
+        self.assertEqual(target.render({"class:add": '"y"', "id:del": '"x"'}), ' class="box y" id=""')
+
+    def test_render__memoized_for_static_attributes(self):
+        target = self._makeOne([("class", '"box"')])
+        attributes = self._getTarget()([("class:add", '"y"')])
+        self.assertEqual(target.render(attributes), ' class="box y"')
+        self.assertIn(id(attributes), target.rendered)
+        self.assertEqual(target.render(attributes), ' class="box y"')
+
+    def test_render__not_memoized_for_dict(self):
+        target = self._makeOne([("class", '"box"')])
+        self.assertEqual(target.render({"class:add": '"y"'}), ' class="box y"')
+        self.assertEqual(len(target.rendered), 0)
+
+    def test_render__memo_does_not_keep_attributes_alive(self):
+        import gc
+        target = self._makeOne([("class", '"box"')])
+        attributes = self._getTarget()([("class:add", '"y"')])
+        target.render(attributes)
+        del attributes
+        gc.collect()
+        self.assertEqual(len(target.rendered), 0)
+
+    def test_read_only(self):
+        target = self._makeOne([("class", '"box"')])
+        with self.assertRaises(TypeError):
+            target["id"] = '"x"'
+        with self.assertRaises(TypeError):
+            target.update({"id": '"x"'})
+        with self.assertRaises(TypeError):
+            del target["class"]
+        self.assertEqual(target, {"class": '"box"'})
@@ -0,0 +1,70 @@
+# -*- coding:utf-8 -*-
+import sys
+import json
+import threading
+from collections import OrderedDict
+
+# the stages reported to the observer, in the order of the pipeline
+#   lex -- info: tokens
+#   parse -- info: nodes
+#   codegen -- info: source_size
+#   compile -- compile() of the generated source (info: cached, if the bytecode cache is used)
+#   write -- compile_module(), writing the generated source into outdir
+#   load -- executing the module (load_module() or in-memory)
+#   import -- importing the module already compiled into outdir (sys.path)
+STAGES = ("lex", "parse", "codegen", "compile", "write", "load", "import")
+
+
+class TraceSummary(object):
+    """the stock observer, aggregating the reports per stage and per module.
+
+        summary = TraceSummary()
+        repository = get_repository(directories, observer=summary)
+        atexit.register(summary.dump, "trace.json")
+    """
+    def __init__(self):
+        self.stages = OrderedDict()  # stage -> {"count", "seconds", "max"}
+        self.modules = OrderedDict()  # module id -> {stage: seconds, **info}
+        self.lock = threading.Lock()
+
+    def __call__(self, module_id, stage, seconds, info):
+        with self.lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = {"count": 0, "seconds": 0.0, "max": 0.0}
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+
+            module = self.modules.get(module_id)
+            if module is None:
+                module = self.modules[module_id] = OrderedDict()
+            module[stage] = module.get(stage, 0.0) + seconds
+            module.update(info)
+
+    def summary(self):
+        with self.lock:
+            return {
+                "stages": OrderedDict((k, dict(v)) for k, v in self.stages.items()),
+                "modules": OrderedDict((k, dict(v)) for k, v in self.modules.items()),
+            }
+
+    def slowest(self, n=10):
+        """[(module id, seconds)] sorted by the total of all stages"""
+        with self.lock:
+            totals = [(k, sum(v[stage] for stage in STAGES if stage in v)) for k, v in self.modules.items()]
+        return sorted(totals, key=lambda x: x[1], reverse=True)[:n]
+
+    def dump(self, path=None):
+        """writing the summary as json into the path (or stderr)"""
+        text = json.dumps(self.summary(), indent=2)
+        if path is None:
+            print(text, file=sys.stderr)
+        else:
+            with open(path, "w") as wf:
+                wf.write(text)
+
+    def clear(self):
+        with self.lock:
+            self.stages.clear()
+            self.modules.clear()
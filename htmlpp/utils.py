@@ -1,7 +1,9 @@
 # -*- coding:utf-8 -*-
 import re
-import shlex
+import hashlib
+import weakref
 from collections import OrderedDict, defaultdict
+from functools import lru_cache
 
 
 _marker = object()
@@ -17,6 +19,58 @@ class Gensym(object):
         return "{}{}".format(name, i)
 
 
+class reify(object):
+    """cached property, computed at the first access"""
+    def __init__(self, wrapped):
+        self.wrapped = wrapped
+        self.__doc__ = wrapped.__doc__
+
+    def __get__(self, inst, objtype=None):
+        if inst is None:
+            return self
+        value = inst.__dict__[self.wrapped.__name__] = self.wrapped(inst)
+        return value
+
+
+class LRUCache(object):
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.d = OrderedDict()
+
+    def get(self, k, default=None):
+        try:
+            v = self.d[k]
+        except KeyError:
+            return default
+        self.d.move_to_end(k)
+        return v
+
+    def __contains__(self, k):
+        return k in self.d
+
+    def __len__(self):
+        return len(self.d)
+
+    def __setitem__(self, k, v):
+        self.d[k] = v
+        self.d.move_to_end(k)
+        if len(self.d) > self.maxsize:
+            self.d.popitem(last=False)
+
+    def pop(self, k, default=None):
+        return self.d.pop(k, default)
+
+    def items(self):
+        return list(self.d.items())
+
+    def clear(self):
+        self.d.clear()
+
+
+def digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
 def get_unquoted_string(x):
     if x and x.startswith('"') and x.endswith('"'):
         return x[1:-1]
@@ -59,26 +113,76 @@ def merge_dict(d0, d1):
     return d0
 
 
-def parse_attrs(attribute_string):
-    """dict from html attribute like string"""
-    d = OrderedDict()
-    if not attribute_string:
-        return d
-    s = attribute_string.strip().replace("=", "= ")  # hmm
-    symbols = shlex.split(s, posix=False)
+# quoted string, unclosed quote (error), "=", or word (a word ending with "=" is a key)
+_attr_token_regex = re.compile(r"""\"[^"]*"|'[^']*'|["']|=|[^ \t\r\n="'][^ \t\r\n=]*=?""")
+
+
+@lru_cache(maxsize=1024)
+def _parse_attrs(attribute_string):
+    items = []
     buf = []
+    symbols = _attr_token_regex.findall(attribute_string)
+    if '"' in symbols or "'" in symbols:
+        raise ValueError("No closing quotation")
     itr = iter(symbols)
     for sym in itr:
         if sym.endswith("="):
             if buf:
-                d[" ".join(buf)] = _marker
-            v = next(itr)
-            d[sym[:-1]] = v
+                items.append((" ".join(buf), _marker))
+            items.append((sym[:-1], next(itr, "")))
         else:
             buf.append(sym)
     if buf:
-        d[" ".join(buf)] = _marker
-    return d
+        items.append((" ".join(buf), _marker))
+    return tuple(items)
+
+
+def parse_attrs(attribute_string):
+    """dict from html attribute like string"""
+    if not attribute_string:
+        return OrderedDict()
+    # memoized, the same attributes are repeated in templates. returning a new dict (it is updated by caller)
+    return OrderedDict(_parse_attrs(attribute_string))
+
+
+class StaticAttributes(OrderedDict):
+    """attributes emitted as a constant in generated code (read-only, shared by all renders and passed to @pyimport
+    helpers), merged results are memoized"""
+    def __init__(self, items=()):
+        super().__init__()
+        for k, v in items:
+            OrderedDict.__setitem__(self, k, v)
+        self.default = None  # render(None)
+        # id(attributes) -> (weakref of attributes, string). weak, the constants of the other (e.g. recompiled)
+        # modules are not kept alive by the memo
+        self.rendered = {}
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("StaticAttributes is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = update = setdefault = pop = popitem = clear = move_to_end = _readonly
+
+    def render(self, attributes=None):
+        """string_from_attrs(self + attributes)"""
+        if attributes is None:
+            if self.default is None:
+                self.default = string_from_attrs(merge_dict(OrderedDict(), self))
+            return self.default
+        key = id(attributes)
+        cached = self.rendered.get(key)
+        if cached is not None and cached[0]() is attributes:
+            return cached[1]
+        D = merge_dict(OrderedDict(), self)
+        merge_dict(D, attributes)
+        result = string_from_attrs(D)
+        if isinstance(attributes, StaticAttributes):
+            rendered = self.rendered
+
+            def forget(ref):
+                if rendered.get(key, (None, ))[0] is ref:
+                    del rendered[key]
+            rendered[key] = (weakref.ref(attributes, forget), result)
+        return result
 
 
 def string_from_attrs(attrs):
@@ -42,7 +42,7 @@ setup(name='htmlpp',
       author="podhmo",
       author_email="ababjam61@gmail.com",
       url="",
-      packages=find_packages(exclude=["tests.*"]),
+      packages=find_packages(exclude=["tests.*", "benchmarks", "benchmarks.*"]),
       include_package_data=True,
       zip_safe=False,
       install_requires=install_requires,